@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+#Python3
+# coding: utf-8
+
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+STARTUP_BUDGET = 1.5 # seconds, cold start of "scraper.py scrape 10" from a warm cache
+HEAVY_MODULES = ['requests', 'matplotlib', 'seaborn', 'IPython', 'selenium', 'bs4'] # must not be imported by the cached read path
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, 'fixtures') # crime_pages.json and donki_events.json, see "record" and "synthetic.py fixtures"
+SUITE_BENCHMARKS = ['weather', 'crime', 'donki', 'merge', 'stats', 'graph']
+SUITE_YEARS = [1, 10, 100] # date ranges ending 2021-12-31
+SUITE_STATIONS = [1, 10, 100, 1000] # weather stations, over 1 year
+REGRESSION_RATIO = 1.25 # compare fails when a median time grows by more than this
+
+
+def seed_cache(cache_dir, start='2021-01-01', end='2021-12-31'):
+    # fills cache_dir with synthetic sources and the merged dataset, so scraper.py reads everything from the cache, returns the weather path the keys were built with
+    os.environ['SCRAPER_CACHE_DIR'] = cache_dir
+    sys.path.insert(0, HERE)
+    import scraper
+    import synthetic
+    scraper.CACHE_DIR = cache_dir
+    weather = os.path.join(HERE, scraper.WEATHER_CSV) # the default is relative to the repository, not to the working directory of the benchmark
+    frames = synthetic.generate_sources(start, end)
+    for name, key in scraper.source_keys(start, end, weather).items():
+        scraper.cache_store(key, frames[name])
+    scraper.load_merged(start, end, weather=weather)
+    return weather
+
+
+def bench_startup(runs=5, budget=STARTUP_BUDGET):
+    # wall time of fresh "scraper.py scrape 10" processes against a warm cache, and the modules they import
+    with tempfile.TemporaryDirectory() as cache_dir:
+        weather = seed_cache(cache_dir)
+        env = dict(os.environ, SCRAPER_CACHE_DIR=cache_dir)
+        command = [sys.executable, '-X', 'importtime', os.path.join(HERE, 'scraper.py'), '--weather', weather, 'scrape', '10']
+        times = []
+        for run in range(runs):
+            started = time.perf_counter()
+            process = subprocess.run(command, env=env, cwd=HERE, capture_output=True, text=True, check=True)
+            times.append(time.perf_counter() - started)
+            if 'Loading from cache' not in process.stdout:
+                raise RuntimeError('scraper.py did not read the dataset from the cache:\n' + process.stdout)
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    imports = [line.split('|') for line in process.stderr.splitlines() if line.startswith('import time:') and 'cumulative' not in line]
+    modules = {fields[2].strip(): int(fields[1]) for fields in imports}
+    heavy = sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES))
+    slowest = sorted(((name, us) for name, us in modules.items() if not name.startswith(' ') and '.' not in name.strip()), key=lambda item: -item[1])[:10]
+    times.sort()
+    return {
+        'name': 'startup',
+        'command': 'scraper.py scrape 10 (warm cache)',
+        'runs': runs,
+        'min s': times[0],
+        'median s': times[len(times) // 2],
+        'budget s': budget,
+        'heavy modules imported': heavy,
+        'slowest imports ms': {name: us / 1000 for name, us in slowest},
+        'passed': times[len(times) // 2] <= budget and not heavy,
+    }
+
+
+def import_scraper():
+    sys.path.insert(0, HERE)
+    import scraper
+    import synthetic
+    return scraper, synthetic
+
+
+def environment():
+    # versions and commit a run was measured with, so results of different runs can be compared
+    import numpy as np
+    import pandas as pd
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def measure(name, scale, rows, function, runs):
+    # times function() runs times with its output silenced, returns one result record
+    times = []
+    for run in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - started)
+    times.sort()
+    result = {'name': name, 'scale': scale, 'rows': rows, 'runs': runs, 'min s': times[0], 'median s': times[len(times) // 2], 'rows/sec': rows / max(times[0], 1e-9)}
+    print(f"{name:8} {json.dumps(scale):40} {rows:>10,} rows {result['median s']:9.4f}s {result['rows/sec']:>14,.0f} rows/sec", file=sys.stderr)
+    return result
+
+
+def year_range(years):
+    return f'{2022 - years}-01-01', '2021-12-31'
+
+
+def json_pages(pages):
+    # response bodies, so parser benchmarks include decoding the JSON as fetch_crimedata()/fetch_donki() do
+    return [json.dumps(page) for page in pages]
+
+
+def bench_weather(scraper, synthetic, years, stations, runs, workdir):
+    # read_weatherdata() + daily_weather(), the work of load_weatherdata() on a cache miss, over years x 1 station and 1 year x stations
+    scales = [(n, 1) for n in years] + [(1, n) for n in stations if n != 1 or 1 not in years]
+    results = []
+    for n_years, n_stations in scales:
+        start, end = year_range(n_years)
+        path = synthetic.generate_weather_csv(os.path.join(workdir, f'weather-{n_years}y-{n_stations}s.csv'), n_stations, start, end)
+        rows = n_stations * len(scraper.pd.date_range(start, end))
+        results.append(measure('weather', {'years': n_years, 'stations': n_stations}, rows, lambda: scraper.daily_weather(scraper.read_weatherdata(path, start, end)), runs))
+        os.remove(path)
+    return results
+
+
+def bench_crime(scraper, synthetic, years, runs, fixtures):
+    # parse_crime_pages() of the recorded pages and of synthetic pages over years
+    sources = [({'fixture': 'crime_pages.json'}, json.load(open(os.path.join(fixtures, 'crime_pages.json'))))]
+    sources += [({'years': n}, synthetic.generate_crime_pages(*year_range(n))) for n in years]
+    results = []
+    for scale, pages in sources:
+        bodies = json_pages(pages)
+        rows = sum(len(page) for page in pages)
+        results.append(measure('crime', scale, rows, lambda: scraper.parse_crime_pages([json.loads(body) for body in bodies]), runs))
+    return results
+
+
+def bench_donki(scraper, synthetic, years, runs, fixtures):
+    # parse_donki() of the recorded events and of synthetic events over years
+    sources = [({'fixture': 'donki_events.json'}, json.load(open(os.path.join(fixtures, 'donki_events.json'))))]
+    sources += [({'years': n}, synthetic.generate_donki_events(*year_range(n))) for n in years]
+    results = []
+    for scale, events in sources:
+        bodies = {event: json.dumps(records) for event, records in events.items()}
+        rows = sum(len(records) for records in events.values())
+        results.append(measure('donki', scale, rows, lambda: scraper.parse_donki({event: json.loads(body) for event, body in bodies.items()}), runs))
+    return results
+
+
+def merged_sources(scraper, synthetic, n_years):
+    frames = synthetic.generate_sources(*year_range(n_years))
+    return frames, scraper.merge_frames(frames['weather'], frames['crime'], frames['FLR'], frames['GST'], frames['CME'])
+
+
+def bench_merge(scraper, synthetic, years, runs):
+    results = []
+    for n in years:
+        frames, merge = merged_sources(scraper, synthetic, n)
+        results.append(measure('merge', {'years': n}, len(merge), lambda: scraper.merge_frames(frames['weather'], frames['crime'], frames['FLR'], frames['GST'], frames['CME']), runs))
+    return results
+
+
+def bench_stats(scraper, synthetic, years, runs):
+    results = []
+    for n in years:
+        frames, merge = merged_sources(scraper, synthetic, n)
+        results.append(measure('stats', {'years': n}, len(merge), lambda: scraper.show_stats(merge), runs))
+    return results
+
+
+def bench_graph(scraper, synthetic, years, runs, workdir):
+    # headless show_graph(), every panel rendered to a PNG file
+    results = []
+    for n in years:
+        frames, merge = merged_sources(scraper, synthetic, n)
+        results.append(measure('graph', {'years': n}, len(merge), lambda: scraper.show_graph(merge, out=os.path.join(workdir, 'graphs')), runs))
+    return results
+
+
+def bench_suite(benchmarks=SUITE_BENCHMARKS, years=SUITE_YEARS, stations=SUITE_STATIONS, runs=3, fixtures=FIXTURES_DIR):
+    # ingestion, parsers, merge, stats and graph benchmarks against the fixtures and synthetic data, returns one record per benchmark x scale
+    scraper, synthetic = import_scraper()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in benchmarks:
+            if name == 'weather':
+                results += bench_weather(scraper, synthetic, years, stations, runs, workdir)
+            elif name == 'crime':
+                results += bench_crime(scraper, synthetic, years, runs, fixtures)
+            elif name == 'donki':
+                results += bench_donki(scraper, synthetic, years, runs, fixtures)
+            elif name == 'merge':
+                results += bench_merge(scraper, synthetic, years, runs)
+            elif name == 'stats':
+                results += bench_stats(scraper, synthetic, years, runs)
+            elif name == 'graph':
+                results += bench_graph(scraper, synthetic, years, runs, workdir)
+    return results
+
+
+def record_fixtures(directory=FIXTURES_DIR, start='2021-01-01', end='2021-12-31'):
+    # replaces the fixtures with the responses of the live crime and DONKI endpoints (CRIME_API_URL, DONKI_API_URL)
+    scraper, synthetic = import_scraper()
+    days = (scraper.pd.Timestamp(end) - scraper.pd.Timestamp(start)).days + 1
+    with scraper.http_session() as session:
+        pages = []
+        for offset in range(0, days, scraper.CRIME_PAGE_SIZE):
+            r = session.get(scraper.CRIME_API_URL, params=scraper.crime_page_params(start, end, offset), timeout=30)
+            r.raise_for_status()
+            pages.append(r.json())
+    events = scraper.fetch_donki(start, end)
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, 'crime_pages.json'), os.path.join(directory, 'donki_events.json')]
+    for path, payload in zip(paths, [pages, events]):
+        with open(path, 'w') as f:
+            json.dump(payload, f)
+    return [{'name': 'record', 'path': path, 'bytes': os.path.getsize(path)} for path in paths]
+
+
+def serve_crime_pages(pages, port=0):
+    # stub of the crime query endpoint on 127.0.0.1, answering $offset/$limit with the records of the recorded pages
+    records = [record for page in pages for record in page]
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            offset, limit = int(query.get('$offset', ['0'])[0]), int(query.get('$limit', [str(len(records))])[0])
+            body = json.dumps(records[offset:offset + limit]).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args): # no request log
+            pass
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_crime(fixtures=FIXTURES_DIR, start='2021-01-01', end='2021-12-31'):
+    # fetch_crimedata() against a stub serving the recorded crime pages must return one ordered int32 count per day
+    scraper, synthetic = import_scraper()
+    with open(os.path.join(fixtures, 'crime_pages.json')) as f:
+        server = serve_crime_pages(json.load(f))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            crime = scraper.fetch_crimedata(start, end, url=f'http://127.0.0.1:{server.server_address[1]}/resource.json')
+    finally:
+        server.shutdown()
+        server.server_close()
+    days = len(scraper.pd.date_range(start, end))
+    return {
+        'name': 'check crime',
+        'rows': len(crime),
+        'expected rows': days,
+        'dtype': str(crime['CRIME'].dtype),
+        'ordered': crime.index.is_monotonic_increasing and crime.index.is_unique,
+        'passed': len(crime) == days and crime['CRIME'].dtype == 'int32' and crime.index.is_monotonic_increasing and crime.index.is_unique,
+    }
+
+
+def compare(baseline, current, ratio=REGRESSION_RATIO):
+    # matches results of two runs by benchmark and scale, a result whose median time grew by more than ratio is a regression
+    def keyed(run):
+        return {(result['name'], json.dumps(result.get('scale'), sort_keys=True)): result for result in run['results'] if 'median s' in result}
+    before, after = keyed(baseline), keyed(current)
+    results = []
+    for key in [key for key in after if key in before]:
+        change = after[key]['median s'] / max(before[key]['median s'], 1e-9)
+        results.append({'name': key[0], 'scale': json.loads(key[1]), 'baseline s': before[key]['median s'], 'current s': after[key]['median s'], 'ratio': change, 'passed': change <= ratio})
+        print(f"{key[0]:8} {key[1]:40} {before[key]['median s']:9.4f}s -> {after[key]['median s']:9.4f}s  x{change:5.2f}{'' if change <= ratio else '  REGRESSION'}", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of scraper.py, results are printed and optionally written as JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+    startup = commands.add_parser('startup', help=f'cold start time of the cached read path, fails above the budget or when a heavy module ({", ".join(HEAVY_MODULES)}) is imported')
+    startup.add_argument('--runs', type=int, default=5)
+    startup.add_argument('--budget', type=float, default=STARTUP_BUDGET, help='seconds (default: %(default)s)')
+    suite = commands.add_parser('suite', help='ingestion, parser, merge, stats and headless graph benchmarks on the fixtures and synthetic data scaled by years and stations')
+    suite.add_argument('benchmarks', nargs='*', default=SUITE_BENCHMARKS, metavar='BENCHMARK', help=f'any of {", ".join(SUITE_BENCHMARKS)} (default: all)')
+    suite.add_argument('--years', type=int, nargs='+', default=SUITE_YEARS, help='date range sizes (default: %(default)s)')
+    suite.add_argument('--stations', type=int, nargs='+', default=SUITE_STATIONS, help='weather station counts (default: %(default)s)')
+    suite.add_argument('--runs', type=int, default=3)
+    suite.add_argument('--fixtures', type=str, default=FIXTURES_DIR)
+    record = commands.add_parser('record', help='records the fixtures from the live crime and DONKI endpoints')
+    record.add_argument('--fixtures', type=str, default=FIXTURES_DIR)
+    check = commands.add_parser('check', help='fetches the crime data from a local stub serving the recorded pages, fails unless one ordered int32 count is returned per day of 2021')
+    check.add_argument('--fixtures', type=str, default=FIXTURES_DIR)
+    baseline = commands.add_parser('compare', help='compares two result files, fails when a benchmark is slower than the baseline by more than the ratio')
+    baseline.add_argument('baseline', type=str)
+    baseline.add_argument('current', type=str)
+    baseline.add_argument('--ratio', type=float, default=REGRESSION_RATIO, help='(default: %(default)s)')
+    parser.add_argument('--output', type=str, help='writes results to this .json file')
+    args = parser.parse_args()
+    if args.command == 'startup':
+        results = [bench_startup(args.runs, args.budget)]
+    elif args.command == 'suite':
+        unknown = set(args.benchmarks) - set(SUITE_BENCHMARKS)
+        if unknown:
+            parser.error(f'unknown benchmark(s): {", ".join(sorted(unknown))}')
+        results = bench_suite(args.benchmarks, args.years, args.stations, args.runs, args.fixtures)
+    elif args.command == 'record':
+        results = record_fixtures(args.fixtures)
+    elif args.command == 'check':
+        results = [check_crime(args.fixtures)]
+    elif args.command == 'compare':
+        with open(args.baseline) as before, open(args.current) as after:
+            results = compare(json.load(before), json.load(after), args.ratio)
+    run = {'environment': environment(), 'results': results}
+    print(json.dumps(run, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    sys.exit(0 if all(result.get('passed', True) for result in results) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#Python3
+# coding: utf-8
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUERIES = [ # mix of dashboard queries against "scraper.py serve"
+    '/slice?start=2021-03-01&end=2021-03-31',
+    '/slice?start=2021-06-01&end=2021-08-31&columns=CRIME,TMAX,TMIN',
+    '/stats',
+    '/stats?start=2021-01-01&end=2021-06-30&columns=CRIME,PRCP,FLR%20Class',
+    '/correlation?method=pearson',
+    '/correlation?method=lagged&start=2021-04-01&end=2021-09-30',
+    '/plot?panel=temperature',
+    '/plot?panel=solar-flares&start=2021-05-01&end=2021-05-31',
+]
+
+
+def random_query(rng, start=datetime.date(2021, 1, 1), days=365):
+    # a query over a random date range of at least a week, so results are not served from the cache of the server
+    first = rng.randrange(days - 7)
+    last = rng.randrange(first + 7, days)
+    path = rng.choice(['/slice', '/stats', '/correlation?method=spearman', '/plot?panel=precipitation'])
+    return f"{path}{'&' if '?' in path else '?'}start={start + datetime.timedelta(first)}&end={start + datetime.timedelta(last)}"
+
+
+def run_worker(url, paths):
+    # requests paths in order over one keep-alive connection, returns (path, status, seconds, bytes) per request
+    target = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+    results = []
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            body = response.read()
+            results.append((path, response.status, time.perf_counter() - started, len(body)))
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+            results.append((path, 0, time.perf_counter() - started, 0))
+    connection.close()
+    return results
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else None
+
+
+def load_test(url, requests=2000, concurrency=8, paths=QUERIES, cold=False, seed=0):
+    # sends requests spread over concurrency keep-alive connections, returns requests/sec and latency percentiles
+    rng = random.Random(seed)
+    plan = [random_query(rng) if cold else paths[number % len(paths)] for number in range(requests)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        results = [result for worker in pool.map(lambda shard: run_worker(url, plan[shard::concurrency]), range(concurrency)) for result in worker]
+        elapsed = time.perf_counter() - started
+    latencies = sorted(seconds for path, status, seconds, size in results)
+    per_path = {}
+    for path, status, seconds, size in results:
+        entry = per_path.setdefault(path.split('?')[0] if cold else path, {'requests': 0, 'errors': 0, 'total ms': 0.0})
+        entry['requests'] += 1
+        entry['errors'] += status != 200
+        entry['total ms'] += seconds * 1000
+    return {
+        'url': url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'cold': cold,
+        'seconds': elapsed,
+        'requests/sec': requests / elapsed,
+        'errors': sum(status != 200 for path, status, seconds, size in results),
+        'bytes': sum(size for path, status, seconds, size in results),
+        'latency ms': {name: percentile(latencies, q) * 1000 for name, q in [('p50', 50), ('p90', 90), ('p99', 99), ('max', 100)]},
+        'paths': {path: {'requests': entry['requests'], 'errors': entry['errors'], 'mean ms': entry['total ms'] / entry['requests']} for path, entry in per_path.items()},
+    }
+
+
+def start_server(port, arguments=()):
+    # starts "scraper.py serve" and waits until it answers
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, 'scraper.py'), *arguments, 'serve', '--port', str(port)], cwd=HERE, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.5)
+        if process.poll() is not None:
+            raise RuntimeError('scraper.py serve exited before answering')
+    process.terminate()
+    raise RuntimeError('scraper.py serve did not answer within 120 seconds')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of "scraper.py serve", measures requests/sec and latency of a mix of dashboard queries')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8000', help='server to test (default: %(default)s)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel keep-alive connections (default: %(default)s)')
+    parser.add_argument('--cold', action='store_true', help='random date ranges, so queries miss the result cache of the server')
+    parser.add_argument('--serve', action='store_true', help='starts "scraper.py serve" on the port of --url for the test, reading the dataset from the cache')
+    parser.add_argument('--output', type=str, help='writes results to this .json file')
+    args = parser.parse_args()
+    process = start_server(urllib.parse.urlsplit(args.url).port or 80) if args.serve else None
+    try:
+        results = load_test(args.url, args.requests, args.concurrency, cold=args.cold)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if results['errors'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -4,30 +4,120 @@
 
 import sys
 import os
-import re
 import argparse
 import textwrap
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup as bs
 import time
-from selenium import webdriver # necessary due to limitation of BeautifulSoup (i.e. unable to extra JS dynamic tables).
-from selenium.webdriver.chrome.options import Options # necessary due to limitation of BeautifulSoup (i.e. unable to extra JS dynamic tables).
-import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import namedtuple, OrderedDict
 import json
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import seaborn as sns
-from IPython.display import display
+import io
+import hashlib
+import importlib.util
+import glob
+import functools
+import threading
+import contextlib
+# requests, matplotlib, selenium and bs4 are imported by the functions that use them, so commands that only read the cache start quickly
 
-parser = argparse.ArgumentParser(
-        prog='ProgramName',
+CRIME_API_URL = os.environ.get('CRIME_API_URL', 'https://data.lacity.org/resource/2nrs-mtv8.json') # SODA query endpoint of the LA City crime dataset, override to point at a local stub server serving recorded pages
+CRIME_QUERY_URL = 'https://data.lacity.org/Public-Safety/Crime-Data-from-2020-to-Present/2nrs-mtv8/explore/query/SELECT%20%60date_occ%60%2C%20count%28%60date_occ%60%29%20AS%20%60count_date_occ%60%0AGROUP%20BY%20%60date_occ%60%0AHAVING%0A%20%20%60date_occ%60%0A%20%20%20%20BETWEEN%20%22{}T00%3A00%3A00%22%20%3A%3A%20floating_timestamp%0A%20%20%20%20AND%20%22{}T23%3A45%3A00%22%20%3A%3A%20floating_timestamp/page/aggregate' # explorer page used by the Selenium fallback
+CRIME_INCIDENTS_URL = os.environ.get('CRIME_INCIDENTS_URL', 'https://data.lacity.org/api/views/2nrs-mtv8/rows.csv?accessType=DOWNLOAD') # full incident-level dataset (2020-present) as .CSV
+CRIME_INCIDENT_DTYPES = {'DATE OCC': 'str', 'TIME OCC': 'int16', 'AREA': 'int8', 'Crm Cd': 'int16'}
+CRIME_CUBE_LEVELS = ['DATE', 'HOUR', 'AREA'] # dimensions of the incident aggregate cube, 'CRM CD' (crime code) may be added
+CRIME_CHUNK_ROWS = 500_000 # incident rows read at a time
+CRIME_PAGE_SIZE = 100 # rows (days) requested per page from the query endpoint
+HTTP_WORKERS = 8 # concurrent requests, and size of the pooled HTTP session
+DONKI_API_URL = os.environ.get('DONKI_API_URL', 'https://api.nasa.gov/DONKI/') # DONKI (NASA Public API), override to point at a local stub server
+NASA_API_KEY = os.environ.get('NASA_API_KEY', '...') # Replace "..." with your public API key obtained from api.nasa.gov (or set NASA_API_KEY)
+DONKI_EVENTS = ['FLR', 'GST', 'CME'] # Solar Flare, Geomagnetic Storm, Coronal Mass Ejection
+DONKI_SCHEMA = 3 # part of the DONKI cache keys, entries cached with an earlier layout of the event frames are refetched
+FLR_CLASSES = ['A', 'B', 'C', 'M', 'X'] # weakest to strongest, peak X-ray flux of A1.0 is 1e-8 W/m2 and grows 10-fold per class
+CME_CLASSES = ['S', 'C', 'O', 'R', 'ER'] # weakest to strongest
+WEATHER_CSV = 'NOAA Los Angeles County 2021 Daily Weather.csv'
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://www.ncei.noaa.gov/access/services/data/v1') # NCEI data service, used by --refresh to download days newer than WEATHER_CSV
+WEATHER_STATION = 'USW00093134' # LOS ANGELES DOWNTOWN USC, CA US
+WEATHER_COLUMNS = ['AWND', 'PRCP', 'TMAX', 'TMIN', 'WDF2', 'WDF5', 'WSF2', 'WSF5', 'WT01', 'WT02', 'WT08']
+WEATHER_DTYPES = {'STATION': 'category', 'DATE': 'str', **{column: 'float32' for column in WEATHER_COLUMNS[:8]}, **{column: 'Int8' for column in WEATHER_COLUMNS[8:]}} # WT* are 0/1 flags
+WEATHER_AGGREGATES = {**{column: 'mean' for column in WEATHER_COLUMNS[:8]}, **{column: 'max' for column in WEATHER_COLUMNS[8:]}}
+WEATHER_CHUNK_ROWS = 1_000_000 # rows read from a NOAA .CSV at a time
+DATA_DIR = os.environ.get('SCRAPER_DATA_DIR', 'data') # merged dataset maintained by --refresh, never evicted
+STORE_MAX_PARTS = 64 # refresh parts are compacted into one once there are more than this
+CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR', '.cache') # per-source cache of collected datasets
+CACHE_TTL = 7 * 24 * 3600 # seconds before a cached source is considered stale and refetched
+CACHE_MAX_BYTES = 512 * 1024**2 # least recently used cache entries are evicted beyond this size
+STATS_MEASURES = ['AWND', 'PRCP', 'TMAX', 'TMIN', 'WSF2', 'WSF5', 'FLR Flux'] # compared with their mean by --stats
+STATS_FLAGS = ['WT01', 'WT02', 'WT08'] # 0/1 weather types
+STATS_EVENTS = ['FLR Class', 'GST Index', 'CME Class'] # space weather events, present on a day or not
+STATS_LAGS = 7 # days of lag for cross-correlations with CRIME
+SIGNIF_RESAMPLES = 2000 # permutation and bootstrap resamples per variable and lag
+SIGNIF_BLOCK_DAYS = 7 # block length of the block bootstrap, keeps weekly patterns of crime within a block
+SIGNIF_BATCH = 250 # resamples computed together as one index matrix
+MERGE_SCHEMA = { # dtypes of the merged dataset, nullable where days may be missing
+    **{column: WEATHER_DTYPES[column] for column in WEATHER_COLUMNS},
+    'CRIME': 'Int32',
+    'FLR Class': pd.CategoricalDtype(FLR_CLASSES, ordered=True),
+    'FLR Scale': 'float32',
+    'FLR Flux': 'float32', # W/m2, FLR Class x FLR Scale
+    'GST Index': 'float32', # Kp index, reported in thirds (e.g. 6.67)
+    'CME Class': pd.CategoricalDtype(CME_CLASSES, ordered=True),
+}
+GRAPH_PANELS = [ # one line graph per entry, CRIME against the columns of each group in 'axes' (one twin y-axis per group)
+    {'name': 'precipitation', 'title': "Crime vs Precipitation", 'axes': [[('PRCP', 'blue')]]},
+    {'name': 'temperature', 'title': "Crime vs Temperature Max (TMAX, TMIN)", 'axes': [[('TMAX', 'blue'), ('TMIN', 'green')]]},
+    {'name': 'wind', 'title': "Crime vs Average Daily Wind Speed (AWND)", 'axes': [[('AWND', 'blue')]]},
+    {'name': 'wind-gusts', 'title': "Crime vs Fastest 2-minute (WSF2) and 5-second (WSF5) wind speed", 'axes': [[('WSF2', 'blue'), ('WSF5', 'green')]]},
+    {'name': 'fog', 'title': "Crime vs Weather Conditions:  WT01 (fog, ice fog, freezing fog),  WT02 (heavy fog)", 'axes': [[('WT01', 'blue'), ('WT02', 'green')]]},
+    {'name': 'smoke', 'title': "Crime vs Weather Condition WT08 (smoke or haze)", 'axes': [[('WT08', 'blue')]]},
+    {'name': 'solar-flares', 'title': "Crime vs Solar Flares (FLR Class, FLR Flux)", 'axes': [[('FLR Class', 'blue')], [('FLR Flux', 'green')]], 'log': ['FLR Flux']},
+    {'name': 'geomagnetic-storms', 'title': "Crime vs Geomagnetic Storms (GST Index)", 'axes': [[('GST Index', 'blue')]]},
+    {'name': 'coronal-mass-ejections', 'title': "Crime vs Coronal Mass Ejection (CME Class)", 'axes': [[('CME Class', 'blue')]]},
+]
+GRAPH_MAX_POINTS = 2000 # longer series are decimated (LTTB) before plotting
+STAGE_RETRIES = 3 # attempts after the first one, per pipeline stage
+STAGE_BACKOFF = 2.0 # seconds before the first retry, doubled for each further retry
+STAGE_NOT_RETRIED = (ImportError, FileNotFoundError) # a missing package or input file fails the stage at once, a retry cannot fix it
+SERVE_CACHE_SIZE = 256 # query results kept by the serve command
+SERVE_RELOAD_SECONDS = 5.0 # interval of the serve command's check for an updated dataset
+PROFILE_TABLE_COLUMNS = ['calls', 'wall s', 'cpu s', 'rss delta MB', 'process rss peak MB', 'py peak MB', 'bytes', 'rows', 'cache hit', 'cache miss', 'retries']
+START_DATE = '2021-01-01'
+END_DATE = '2021-12-31'
+
+# DEV NOTE - add .ipynb build below this comment.
+
+
+
+def data_arguments(defaults=True):
+    # dataset options shared by every command, accepted before or after the command name
+    def default(value):
+        return value if defaults else argparse.SUPPRESS # a command must not reset options given before it
+    data = argparse.ArgumentParser(add_help=False)
+    data.add_argument("--start", type=str, default=default(START_DATE), help=f"first day of the dataset [YYYY-MM-DD] (default: {START_DATE})")
+    data.add_argument("--end", type=str, default=default(None), help=f"last day of the dataset [YYYY-MM-DD] (default: {END_DATE}, yesterday with --refresh)")
+    data.add_argument("--weather", type=str, default=default(WEATHER_CSV), help=f"NOAA daily weather from a .CSV file, a directory of .CSV files or a glob pattern, averaging all stations per day (default: {WEATHER_CSV})")
+    data.add_argument("--crime-incidents", type=str, nargs='?', const=CRIME_INCIDENTS_URL, default=default(None), help="builds crime counts from the incident-level crime .CSV (file or URL, default: full dataset download), aggregated per day, hour and area")
+    data.add_argument("--refresh", action='store_true', default=default(False), help="fetches only days newer than the last ingested day of each source, and appends them to the stored dataset")
+    data.add_argument("--ttl", type=float, default=default(CACHE_TTL / 3600), help=f"refetches cached datasets older than H hours (default: {CACHE_TTL / 3600:g})")
+    data.add_argument("--profile", type=str, nargs='?', const='profile.json', default=default(None), metavar='PATH', help="records wall/CPU time, peak memory, bytes downloaded, rows and cache hits of each stage, prints a summary and writes a JSON/Chrome trace file (default: profile.json, open in chrome://tracing or ui.perfetto.dev)")
+    data.add_argument("--profile-memory", action='store_true', default=default(False), help="with --profile, also traces Python allocations (tracemalloc) for the peak memory of each stage, slower")
+    return data
+
+def build_parser():
+    # command line interface, built only when run as a script so importing scraper.py stays cheap
+    data = data_arguments(defaults=False)
+    parser = argparse.ArgumentParser(
+        prog='scraper.py',
+        parents=[data_arguments()],
         formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='Run "scraper.py <command> --help" for the options of a command.  Without a command, the full dataset is printed.',
         description=textwrap.dedent('''\
         Scrapes 2021 Los Angeles weather, space weather anomalies and crime data to identify key trends and correlations
 
         References:  
         https://www.ncei.noaa.gov/cdo-web/search (Data source # 1, .CSV obtained via download)
-        https://data.lacity.org/Public-Safety/Crime-Data-from-2020-to-Present/2nrs-mtv8/explore/query/ (Data source # 2, web scraping using Beautiful Soup and Selenium to extract data from dynamic JS tables)
+        https://data.lacity.org/resource/2nrs-mtv8.json (Data source # 2, aggregated daily counts from the SODA query endpoint, with Beautiful Soup and Selenium web scraping as fallback)
         https://api.nasa.gov/DONKI/ (Data source # 3 from NASAs public API, DONKI focuses on space weather events)
         https://www.ncei.noaa.gov/pub/data/cdo/documentation/LCD_documentation.pdf (NOAA Weather Acronym descriptions)
         https://www.nasa.gov/mission_pages/sunearth/news/classify-flares.html (NASA documentation on classification of Solar Flares)
@@ -48,367 +138,1256 @@ parser = argparse.ArgumentParser(
         CRIME = Total number of crime reports received by Los Angeles on a given day during 2021.
         FLR Class = [A, B, C, M, and X], represents strength of a Solar Flare.  Strength increases 10-fold between each letter, with "A-class" being the weakest strength.
         FLR Scale = [1-9], represents finer scale of strength within a specific Solar Flare class (e.g. A-class).
+        FLR Flux = peak X-ray flux of the Solar Flare (W/m2), derived from FLR Class and FLR Scale (e.g. M3.9 = 3.9e-5).
         GST Index = [0-9], represents the Planetary K-index to characterize Geomagnetic Storms, with 9 being the strongest.
         CME Class = [A, B, C, M, and X], represents strength of a Coronal Mass Ejection.  Strength increases 10-fold between each letter, with "A-class" being the weakest strength.
 
         NOTE:  Datafields SNOW, SNWD, TAVG, TOBS, WESD, WESF, WT03, WT05, WT07, WT11 were intentionally excluded due to empty dataset from NOAA.
 
         '''))
-parser.add_argument("--scrape", type=int, choices=range(1,365), help="Invocation of the flag --scrape N prints to standard output the first N entries of the dataset") # restricts N to data range of 1-365
-parser.add_argument("--save", type=str, help="Invocation of the flag --save <path_to_dataset> saves the complete scraped dataset into the file passed as the input")   
-parser.add_argument("--graph", action='store_true', help="Invocation of the flag --graph displays 9 graphs to interpret datasets from multiple sources")
-parser.add_argument("--stats", action='store_true', help="Invocation of the flag --stats datasets existing above and below the mean")
-args = parser.parse_args()        
-
-# DEV NOTE - add .ipynb build below this comment.
+    commands = parser.add_subparsers(dest='command', metavar='<command>')
+    scrape = commands.add_parser('scrape', parents=[data], help="prints to standard output the first N entries of the dataset")
+    scrape.add_argument('rows', type=int, metavar='N')
+    save = commands.add_parser('save', parents=[data], help="saves the complete scraped dataset into the .CSV file passed as the input")
+    save.add_argument('path', type=str)
+    graph = commands.add_parser('graph', parents=[data], help="displays 9 graphs to interpret datasets from multiple sources (saved to files when no display is available)")
+    graph.add_argument("--out", type=str, help="saves the graphs as files in this directory instead of displaying them")
+    graph.add_argument("--format", type=str, default='png', choices=['png', 'svg'], help="file format of --out (default: %(default)s)")
+    graph.add_argument("--workers", type=int, help="processes rendering the graphs (default: number of CPUs)")
+    stats = commands.add_parser('stats', parents=[data], help="prints the number of days each variable and CRIME are above and below the mean, and correlations (incl. lagged) with CRIME")
+    stats.add_argument("--format", type=str, default='table', choices=['table', 'json'])
+    stats.add_argument("--lags", type=int, default=STATS_LAGS, help="maximum lag in days of the cross-correlations (default: %(default)s)")
+    significance = commands.add_parser('significance', parents=[data], help="tests the correlation of CRIME with each variable and lag, with permutation p-values and block bootstrap confidence intervals")
+    significance.add_argument("--format", type=str, default='table', choices=['table', 'json'])
+    significance.add_argument("--lags", type=int, default=STATS_LAGS, help="maximum lag in days (default: %(default)s)")
+    significance.add_argument("--resamples", type=int, default=SIGNIF_RESAMPLES, help="permutation and bootstrap resamples (default: %(default)s)")
+    significance.add_argument("--seed", type=int, default=0, help="random seed, results are identical for the same seed (default: %(default)s)")
+    significance.add_argument("--workers", type=int, help="processes computing the resamples (default: number of CPUs)")
+    server = commands.add_parser('serve', parents=[data], help="answers date range slices, column stats, correlations and graphs over a local HTTP API, reloading when the cached dataset is updated")
+    server.add_argument("--host", type=str, default='127.0.0.1', help="(default: %(default)s)")
+    server.add_argument("--port", type=int, default=8000, help="(default: %(default)s)")
+    server.add_argument("--cache-size", type=int, default=SERVE_CACHE_SIZE, help="query results kept in memory (default: %(default)s)")
+    server.add_argument("--reload-interval", type=float, default=SERVE_RELOAD_SECONDS, help="seconds between checks for an updated dataset (default: %(default)s)")
+    return parser
 
+def legacy_argv(argv):
+    # translates the flags of earlier versions (e.g. --scrape 10, --stats json) into commands, in place, as they were accepted anywhere among the options
+    legacy = [number for number, arg in enumerate(argv) if arg in ('--scrape', '--save', '--graph', '--stats', '--significance')]
+    if not legacy:
+        return argv
+    first = legacy[0]
+    command = [argv[first][2:]]
+    rest = argv[first + 1:]
+    if command[0] in ('stats', 'significance') and rest[:1] in (['table'], ['json']):
+        command += ['--format', rest[0]]
+        rest = rest[1:]
+    return argv[:first] + command + rest
 
-
-def main():
+def main(argv=None):
     # main function
-    global merge
-    pd.set_option('display.max_rows', None) # changes Pandas default display limit of 10 to None, so that full dataset can be displayed using show_table()
-    pd.set_option('display.max_columns', None) # changes Pandas default display limit of 12 columns to None, so that full dataset can be displayed using show_table()
-    try:
-        # attempts to retrieve data from .csv, to avoid re-building table
-        merge = pd.read_csv('merge.csv', header=0)
-        print('Datasets gathered previously.\nLoading from merge.csv\n')
-    except:
-        # gathers data from sources, builds dataframe
-        print('Initializing collection of datasets.\n', '.'*6, 'Please wait.', '.'*6)
-        add_weatherdata()
-        add_crimedata()
-        add_donki()
-        merge_frames()
-    if args.scrape: # if args.scrape exists, it will print a table of N rows
-        show_table(args.scrape) # replace with arg.scrape
-    elif args.save: # if args.save exists, it will save the file to a location
-        save_csv(args.save)  # replace with arg.save
-    elif args.graph: # if args.graph exists, it will print 9 line graphs using data generated
-        show_graph()
-    elif args.stats: # if args.stats exists, it will print datasets and statistical information based on values existing above and below mean
-        show_stats()
+    parser = build_parser()
+    args = parser.parse_args(legacy_argv(sys.argv[1:] if argv is None else argv))
+    if args.end and args.start > args.end:
+        parser.error(f'--start {args.start} is after --end {args.end}')
+    if args.profile:
+        profile_start(args.profile_memory)
+    with profile_span(f'scraper.py {args.command or ""}'.strip(), 'main') if args.profile else contextlib.nullcontext():
+        run_command(args)
+    if args.profile:
+        profile_report(args.profile)
+
+def run_command(args):
+    # loads the dataset and runs the command given on the command line
+    if args.refresh: # if args.refresh exists, only days newer than each source's watermark are fetched
+        merge = refresh_dataset(args.start, args.end or (pd.Timestamp.today() - pd.Timedelta(days=1)).strftime('%Y-%m-%d'), ttl=args.ttl * 3600, weather=args.weather)
+    else:
+        merge = load_merged(args.start, args.end or END_DATE, ttl=args.ttl * 3600, weather=args.weather, incidents=args.crime_incidents)
+    if args.command == 'scrape': # prints a table of N rows
+        show_table(merge, args.rows)
+    elif args.command == 'save': # saves the file to a location
+        save_csv(merge, args.path)
+    elif args.command == 'graph': # prints 9 line graphs using data generated
+        show_graph(merge, args.out, args.format, args.workers)
+    elif args.command == 'stats': # prints statistical information based on values existing above and below mean
+        show_stats(merge, args.format, args.lags)
+    elif args.command == 'significance': # prints p-values and confidence intervals of the correlations with crime
+        show_significance(merge, args.format, args.lags, args.resamples, seed=args.seed, workers=args.workers)
+    elif args.command == 'serve': # keeps the dataset in memory, reloading it from the cache (never refetching) when another run updated it
+        reload = read_store if args.refresh else lambda: load_merged(args.start, args.end or END_DATE, ttl=None, weather=args.weather, incidents=args.crime_incidents)
+        serve(merge, reload, lambda: dataset_signature(args), args.host, args.port, args.cache_size, args.reload_interval)
     else:
-        show_table(365) # if NO sysargs exist, will display full dataset
-        print('\n\nNo system arguments provided, please type scraper.py --help for more information')
+        show_table(merge, len(merge)) # if NO command is given, will display full dataset
+        print('\n\nNo command provided, please type scraper.py --help for more information')
     
-def add_weatherdata():
-    # data source 1 (csv)
-    global df
-    df = pd.read_csv('NOAA Los Angeles County 2021 Daily Weather.csv', header=0)  # builds table from downloaded weather data .CSV
-    df['DATE'] = pd.to_datetime(df['DATE']) # requirement to sort by date in a panda dataframe
-    df = df.set_index('DATE')
-    df = df.drop(df.columns[[0, 1, 2, 3, 4, 6, 7, 8, 10, 11, 12, 15, 18, 19, 24, 25, 26, 28]], axis=1) # removes empty datasets from table & uneccessary static data (e.g. lattitude, longitude)
+PROFILE = None # {'started', 'memory', 'records'} while --profile is enabled, None otherwise so profiled() calls straight through
+profile_lock = threading.Lock()
+profile_local = threading.local() # stack of the open stage records of each thread
+
+def profile_start(memory=False):
+    # enables recording of profiled() stages, memory=True also traces Python allocations (tracemalloc)
+    global PROFILE
+    PROFILE = {'started': time.perf_counter(), 'memory': memory, 'records': [], 'open': []}
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+
+def profile_record():
+    # innermost open stage record of the calling thread, or None
+    stack = getattr(profile_local, 'stack', None)
+    return stack[-1] if PROFILE is not None and stack else None
+
+def profile_count(counter, amount=1, record=None):
+    # adds amount to a counter (e.g. 'bytes', 'cache hit') of record, or of the innermost open stage of the calling thread
+    record = record or profile_record()
+    if record is not None:
+        with profile_lock:
+            record[counter] = record.get(counter, 0) + amount
+
+def frame_rows(result):
+    # rows produced by a stage, summed over tuples/lists of frames (e.g. parse_donki())
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, (tuple, list)):
+        return sum(frame_rows(item) for item in result)
+    return 0
+
+def peak_rss_mb():
+    # peak resident memory of the process so far, None where the resource module is unavailable (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, kilobytes on Linux
+
+def current_rss_mb():
+    # resident memory of the process now, None without /proc (Windows, macOS)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def fold_py_peak():
+    # folds the traced allocation peak into every open stage, then restarts peak tracking (called with profile_lock held)
+    import tracemalloc
+    current, peak = tracemalloc.get_traced_memory()
+    for record in PROFILE['open']:
+        record['py peak MB'] = max(record['py peak MB'], (peak - record['py start']) / 2**20)
+    tracemalloc.reset_peak()
+
+@contextlib.contextmanager
+def profile_span(name, category):
+    # records wall time, CPU time and RSS growth (of the whole process, including concurrent stages) of the enclosed code, and the peak RSS of the process so far
+    record = {'name': name, 'category': category, 'thread': threading.current_thread().name}
+    stack = profile_local.__dict__.setdefault('stack', [])
+    with profile_lock:
+        if PROFILE['memory']:
+            import tracemalloc
+            fold_py_peak()
+            record['py start'], record['py peak MB'] = tracemalloc.get_traced_memory()[0], 0.0
+        PROFILE['open'].append(record)
+    stack.append(record)
+    started, cpu, rss = time.perf_counter(), time.process_time(), current_rss_mb()
+    try:
+        yield record
+    except BaseException as error:
+        record['error'] = repr(error)
+        raise
+    finally:
+        record['start s'] = started - PROFILE['started']
+        record['wall s'] = time.perf_counter() - started
+        record['cpu s'] = time.process_time() - cpu
+        record['rss delta MB'] = None if rss is None else current_rss_mb() - rss
+        record['process rss peak MB'] = peak_rss_mb() # high-water mark since the process started, not of this stage
+        stack.pop()
+        with profile_lock:
+            if PROFILE['memory']:
+                fold_py_peak()
+                del record['py start']
+            PROFILE['open'].remove(record)
+            PROFILE['records'].append(record)
+
+def profiled(name, category):
+    # decorator recording a function as a stage of --profile, with the rows of the frame(s) it returns, a plain call when profiling is off
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if PROFILE is None:
+                return function(*args, **kwargs)
+            with profile_span(name, category) as record:
+                result = function(*args, **kwargs)
+                profile_count('rows', frame_rows(result), record)
+                return result
+        return wrapper
+    return decorate
+
+def profile_report(path):
+    # prints a summary of the recorded stages and writes them as a Chrome trace (the "stages" key holds the raw records)
+    records = sorted(PROFILE['records'], key=lambda record: record['start s'])
+    threads = {name: number for number, name in enumerate(dict.fromkeys(record['thread'] for record in records), 1)}
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': number, 'args': {'name': name}} for name, number in threads.items()]
+    for record in records:
+        events.append({'name': record['name'], 'cat': record['category'], 'ph': 'X', 'pid': os.getpid(), 'tid': threads[record['thread']],
+                       'ts': record['start s'] * 1e6, 'dur': record['wall s'] * 1e6,
+                       'args': {key: value for key, value in record.items() if key not in ('name', 'category', 'thread', 'start s')}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'stages': records}, f, indent=1)
+    table = pd.DataFrame(records).assign(calls=1).reindex(columns=['category', 'name'] + PROFILE_TABLE_COLUMNS)
+    table = table.groupby(['category', 'name'], sort=False).agg({'calls': 'sum', 'wall s': 'sum', 'cpu s': 'sum', 'rss delta MB': 'sum', 'process rss peak MB': 'max', 'py peak MB': 'max',
+                                                                 'bytes': 'sum', 'rows': 'sum', 'cache hit': 'sum', 'cache miss': 'sum', 'retries': 'sum'})
+    counters = ['calls', 'bytes', 'rows', 'cache hit', 'cache miss', 'retries']
+    table[counters] = table[counters].fillna(0).astype('int64')
+    table = table.dropna(axis=1, how='all').loc[:, lambda frame: (frame != 0).any()] # drops counters no stage recorded
+    print(f'\nProfile ({len(records)} stages, trace written to {path}):')
+    print(table.to_string(float_format=lambda value: f'{value:.3f}'))
+
+def weather_files(path=WEATHER_CSV):
+    # expands a .CSV path, directory of .CSV files or glob pattern into a sorted list of files
+    if not isinstance(path, str):
+        return [path] # already open file or buffer
+    if os.path.isdir(path):
+        path = os.path.join(path, '*.csv')
+    return sorted(glob.glob(path)) or [path]
+
+def parse_day_dates(dates):
+    # NOAA and crime .CSV downloads use M/D/YYYY (crime adds a time of day), the NCEI and SODA services use YYYY-MM-DD
+    if not len(dates):
+        return pd.to_datetime(dates)
+    codes, uniques = pd.factorize(dates.str.slice(0, 10)) # a chunk spans few distinct days, so each is parsed once
+    parsed = pd.to_datetime(uniques, format='%m/%d/%Y' if '/' in str(uniques[0]) else '%Y-%m-%d')
+    return pd.Series(parsed[codes], index=dates.index)
+
+@profiled('parse weather', 'parse')
+def read_weatherdata(path=WEATHER_CSV, start=START_DATE, end=END_DATE, chunksize=WEATHER_CHUNK_ROWS):
+    # data source 1 (csv), streams one or more NOAA daily .CSV files in chunks and returns one row per station and day
+    files = weather_files(path)
+    partials, rows, started = [], 0, time.perf_counter()
+    for source in files:
+        # columns are selected by name, so the loader does not depend on the column layout of a download
+        for chunk in pd.read_csv(source, usecols=lambda column: column in WEATHER_DTYPES, dtype=WEATHER_DTYPES, chunksize=chunksize):
+            rows += len(chunk)
+            chunk['DATE'] = parse_day_dates(chunk['DATE'])
+            chunk = chunk[(chunk['DATE'] >= start) & (chunk['DATE'] <= end)]
+            if 'STATION' not in chunk:
+                chunk['STATION'] = WEATHER_STATION
+            partials.append(aggregate_weather(chunk.reindex(columns=['STATION', 'DATE'] + WEATHER_COLUMNS)))
+            if len(partials) > 64: # keeps memory bounded by the number of station-days, not by the number of rows read
+                partials = [aggregate_weather(pd.concat(partials).reset_index())]
+    weather = aggregate_weather(pd.concat(partials).reset_index()) if len(partials) > 1 else partials[0]
+    elapsed = time.perf_counter() - started
+    print(f'Read {rows:,} weather rows from {len(files)} file(s) in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)')
+    return weather
+
+def aggregate_weather(frame):
+    # reduces rows to one per station and day (duplicate rows, e.g. from overlapping downloads, collapse to one)
+    frame = frame.astype({column: WEATHER_DTYPES[column] for column in WEATHER_COLUMNS})
+    frame['STATION'] = frame['STATION'].astype('category')
+    return frame.groupby(['STATION', 'DATE'], observed=True, sort=True).agg(WEATHER_AGGREGATES)
+
+def daily_weather(weather):
+    # reduces per station rows to one row per day across all stations (mean of measurements, any station reporting a weather type)
+    return weather.groupby(level='DATE', sort=True).agg(WEATHER_AGGREGATES)
+
+@profiled('fetch weather', 'fetch')
+def fetch_weatherdata(start, end, station=WEATHER_STATION, url=WEATHER_API_URL):
+    # data source 1 for days not covered by WEATHER_CSV, downloaded as .CSV from the NCEI data service
+    params = {'dataset': 'daily-summaries', 'stations': station, 'startDate': start, 'endDate': end, 'dataTypes': ','.join(WEATHER_COLUMNS), 'units': 'standard', 'format': 'csv'}
+    with http_session(1) as session:
+        r = session.get(url, params=params, timeout=60)
+        r.raise_for_status()
+    return daily_weather(read_weatherdata(io.StringIO(r.text or 'STATION,DATE'), start, end)) # data types without observations are omitted by the service
+
+def load_weatherdata(start=START_DATE, end=END_DATE, ttl=CACHE_TTL, weather=WEATHER_CSV):
+    # data source 1 from the cache, or from the .CSV file(s) when stale
+    frame = load_source(source_keys(start, end, weather)['weather'], lambda: daily_weather(read_weatherdata(weather, start, end)), ttl)
     print('.'*6, 'Collecting Weather data - 100% Complete', '.'*6)
-    
-def add_crimedata():
-    # data source 2 (web scraping)
-    global df
-    url_iteration = [['01', '03', '31'], ['04', '06', '30'], ['07', '09', '30'], ['10', '12', '31']] # start & end months for iteration through webpage
-    counts = []
-    
-    for i in range(len(url_iteration)): # iterative query for each quarter of the year, as website has a limitation of showing 100 rows per page    
-        s_month = url_iteration[i][0] # retrieves ## of month for start of query
-        e_month = url_iteration[i][1] # retrieves ## of month for end of query
-        d_e_month = url_iteration[i][2] # retrieves ## for the last day in the month at end of query
-        url = 'https://data.lacity.org/Public-Safety/Crime-Data-from-2020-to-Present/2nrs-mtv8/explore/query/SELECT%20%60date_occ%60%2C%20count%28%60date_occ%60%29%20AS%20%60count_date_occ%60%0AGROUP%20BY%20%60date_occ%60%0AHAVING%0A%20%20%60date_occ%60%0A%20%20%20%20BETWEEN%20%222021-' + s_month + '-01T00%3A00%3A00%22%20%3A%3A%20floating_timestamp%0A%20%20%20%20AND%20%222021-' + e_month + '-' + d_e_month + 'T23%3A45%3A00%22%20%3A%3A%20floating_timestamp/page/aggregate'
-        options = webdriver.ChromeOptions() # adds options to selenium, to reduce terminal spam, minimize launched chrome window
-        options.add_argument('headless') # hides chrome in background
-        options.add_argument("start-minimized") # hides chrome in background
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        options.add_argument('log-level=3') # added to reduce terminal spam.  Log values are:  INFO=0, WARNING=1, LOG_ERROR=2, LOG_FATAL=3.
-        browser = webdriver.Chrome(options=options)
-        browser.get(url)
-        if i == 0: # progress indicator code
-            time.sleep(5) # wait 5 seconds to load web-page in chrome using selenium (dynamic JS table), in order for it to be parsed with Beautiful Soup as HTML
-            print('.'*6, 'Collecting Crime data - 25% Complete', '.'*6)
-        if i == 1:
-            time.sleep(5) # wait 5 seconds to load web-page in chrome using selenium (dynamic JS table), in order for it to be parsed with Beautiful Soup as HTML
-            print('.'*6, 'Collecting Crime data - 50% Complete', '.'*6)
-        if i == 2:
-            time.sleep(5) # wait 5 seconds to load web-page in chrome using selenium (dynamic JS table), in order for it to be parsed with Beautiful Soup as HTML
-            print('.'*6, 'Collecting Crime data - 75% Complete', '.'*6)
-        if i == 3:
-            time.sleep(5) # wait 5 seconds to load web-page in chrome using selenium (dynamic JS table), in order for it to be parsed with Beautiful Soup as HTML
-        html = browser.page_source
-        soup = bs(html, 'lxml')
-        table_rows = soup.find_all('td')
-
-        for i in range(len(table_rows)): # iterates through soup by index
-            row = str(table_rows[i])
-            if i % 2 == 0:
-                pass
-                #date = re.search(r'success">(?P<date>2021) (?P<month>[a-zA-Z]{1,3}) (?P<day>\d\d)', row) # test to scrape dates
-            else:
-                count = re.search(r'class="">(?P<crime>\d{1,4})', row) # regex to search soup for table row data, and groups value to be recalled by "crime"
-                counts.append(count.group('crime'))
-    try: # ADDED try/except block, as sometimes web connection fails to grab all 365 data sets and fails to add to DF
-        df = df.assign(CRIME = counts) # ADDs "CRIME" column header to data frame, and 365 values of daily total crime stats to DataFrame
-        print('.'*6, 'Collecting Crime data - 100% Complete', '.'*5)
-    except:
-        print('Web scraping of LA County Crime data 2021 failed, trying again')
-        add_crimedata()
-
-def add_donki():
-    # data source 3 (API)
-    global df_flr, df_gst, df_cme
-    api_key = '...' # Replace "..." with your public API key obtained from api.nasa.gov
-    url_keys = ['FLR', 'GST', 'CME']
-    api_url = 'https://api.nasa.gov/DONKI/{}?startDate=2021-01-01&endDate=2021-12-31&api_key={}'
-    flr_date, flr_class, flr_scale = [], [], []
-    gst_date, gst_index = [], []
-    cme_date, cme_class = [], []
-    
-    for i in range(len(url_keys)): # iterates through three API calls to retrieve FLR, GST, and CME datasets from DONKI
-        html2 = api_url.format(url_keys[i], api_key)
-        r1 = requests.get(html2)
-        
-        if i == 0: # FLR
-            for i in range(len(r1.json())):
-                tmp = r1.json()[i].get('beginTime')
-                flr_date.append(tmp[5:7].lstrip('0') + '/' + tmp[8:10].lstrip('0') + '/' + tmp[0:4])
-                tmp = r1.json()[i].get('classType')
-                flr_class.append(tmp[0:1])
-                flr_scale.append(tmp[1:])
-            print('.'*6, 'Collecting Space Weather data - 33% complete', '.'*6) # progress indicator
-        if i == 1: # GST
-            for i in range(len(r1.json())):
-                tmp = r1.json()[i].get('startTime')
-                gst_date.append(tmp[5:7].lstrip('0') + '/' + tmp[8:10].lstrip('0') + '/' + tmp[0:4])           
-                gst_index.append(r1.json()[i].get('allKpIndex')[0].get('kpIndex'))
-            print('.'*6, 'Collecting Space Weather data - 66% complete', '.'*6) # progress indicator
-        if i == 2: # CME
-            for i in range(len(r1.json())):
-                if r1.json()[i].get('cmeAnalyses') != None: # excludes empty/incomplete datasets found within donki
-                    tmp = r1.json()[i].get('startTime')
-                    cme_date.append(tmp[5:7].lstrip('0') + '/' + tmp[8:10].lstrip('0') + '/' + tmp[0:4])
-                    cme_class.append(r1.json()[i].get('cmeAnalyses')[0].get('type'))
-                else:
-                    continue
-            print('.'*6, 'Collecting Space Weather data - 100% complete', '.'*5) # progress indicator
-    
+    return frame
+
+def http_session(pool_size=HTTP_WORKERS):
+    # builds a pooled HTTP session, shared by concurrent requests so connections are kept alive between pages
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=3)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    record = profile_record()
+    if record is not None: # response bodies are counted towards the stage that opened the session
+        session.hooks['response'].append(lambda response, *args, **kwargs: profile_count('bytes', len(response.content), record))
+    return session
+
+def crime_page_params(start, end, offset, limit=CRIME_PAGE_SIZE):
+    # SoQL parameters for one page of aggregated daily crime counts between start and end (YYYY-MM-DD)
+    return {
+        '$select': 'date_occ, count(date_occ) AS count_date_occ',
+        '$where': f"date_occ between '{start}T00:00:00' and '{end}T23:45:00'",
+        '$group': 'date_occ',
+        '$order': 'date_occ', # stable ordering is required for offset based pagination
+        '$limit': limit,
+        '$offset': offset,
+    }
+
+@profiled('parse crime', 'parse')
+def parse_crime_pages(pages):
+    # parses pages of SODA JSON records ([{"date_occ": ..., "count_date_occ": ...}, ...]) into a DATE indexed frame of daily crime counts
+    records = [record for page in pages for record in page]
+    raw = pd.DataFrame.from_records(records, columns=['date_occ', 'count_date_occ'])
+    crime = pd.DataFrame({
+        'DATE': pd.to_datetime(raw['date_occ'].str.slice(0, 10), format='%Y-%m-%d'),
+        'CRIME': pd.to_numeric(raw['count_date_occ']).astype('int32'),
+    })
+    return crime.set_index('DATE').sort_index()
+
+@profiled('fetch crime', 'fetch')
+def fetch_crimedata(start=START_DATE, end=END_DATE, url=CRIME_API_URL, page_size=CRIME_PAGE_SIZE, workers=HTTP_WORKERS):
+    # fetches aggregated daily crime counts from the query endpoint, pages are requested concurrently over one pooled session
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1 # one aggregated row per day, so the page count is known up front
+    offsets = range(0, days, page_size)
+    with http_session(workers) as session:
+        def fetch_page(offset):
+            r = session.get(url, params=crime_page_params(start, end, offset, page_size), timeout=30)
+            r.raise_for_status()
+            return r.json()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = list(pool.map(fetch_page, offsets))
+    return parse_crime_pages(pages)
+
+@profiled('scrape crime', 'fetch')
+def scrape_crimedata_selenium(start=START_DATE, end=END_DATE):
+    # fallback for fetch_crimedata(), renders the dataset explorer in headless Chrome (dynamic JS table) and parses it with Beautiful Soup
+    from bs4 import BeautifulSoup as bs # imported here, as Selenium and Beautiful Soup are only needed when the query endpoint is unavailable
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    options = webdriver.ChromeOptions() # adds options to selenium, to reduce terminal spam, minimize launched chrome window
+    options.add_argument('headless') # hides chrome in background
+    options.add_argument("start-minimized") # hides chrome in background
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.add_argument('log-level=3') # added to reduce terminal spam.  Log values are:  INFO=0, WARNING=1, LOG_ERROR=2, LOG_FATAL=3.
+    browser = webdriver.Chrome(options=options) # one browser is reused for every query
+    dates, counts = [], []
+    try:
+        for q_start in pd.date_range(start, end, freq='QS'): # iterative query per quarter, as website has a limitation of showing 100 rows per page
+            q_end = min(q_start + pd.offsets.QuarterEnd(0), pd.Timestamp(end))
+            browser.get(CRIME_QUERY_URL.format(q_start.strftime('%Y-%m-%d'), q_end.strftime('%Y-%m-%d')))
+            WebDriverWait(browser, 30).until(EC.presence_of_element_located((By.TAG_NAME, 'td'))) # waits for the JS table to render, instead of a fixed sleep
+            cells = [td.get_text(strip=True) for td in bs(browser.page_source, 'lxml').find_all('td')]
+            dates.extend(cells[0::2]) # table cells alternate between date and count
+            counts.extend(cells[1::2])
+            print('.'*6, f'Collecting Crime data (Selenium) - {q_end.strftime("%b")} Complete', '.'*6)
+    finally:
+        browser.quit()
+    crime = pd.DataFrame({'DATE': pd.to_datetime(dates, format='%Y %b %d'), 'CRIME': pd.to_numeric(counts).astype('int32')})
+    return crime.set_index('DATE').sort_index()
+
+def get_crimedata(start=START_DATE, end=END_DATE):
+    # data source 2, from the query endpoint or by web scraping when the endpoint is unavailable
+    import requests
+    try:
+        return fetch_crimedata(start, end)
+    except (requests.RequestException, ValueError) as error:
+        if not all(importlib.util.find_spec(module) for module in ['selenium', 'bs4']):
+            raise # without the optional fallback, the request error is retried by the crime stage
+        print(f'Crime query endpoint unavailable ({error}), falling back to web scraping')
+        return scrape_crimedata_selenium(start, end)
+
+@profiled('parse crime incidents', 'parse')
+def read_crime_incidents(path=CRIME_INCIDENTS_URL, start=START_DATE, end=END_DATE, levels=CRIME_CUBE_LEVELS, chunksize=CRIME_CHUNK_ROWS):
+    # data source 2 at incident level, streams the full crime .CSV (file or URL) in chunks into a cube of counts per levels (e.g. day x hour x area)
+    partials, rows, started = [], 0, time.perf_counter()
+    for chunk in pd.read_csv(path, usecols=list(CRIME_INCIDENT_DTYPES), dtype=CRIME_INCIDENT_DTYPES, chunksize=chunksize):
+        rows += len(chunk)
+        incidents = pd.DataFrame({
+            'DATE': parse_day_dates(chunk['DATE OCC']),
+            'HOUR': (chunk['TIME OCC'] // 100).astype('int8'), # TIME OCC is reported as HHMM
+            'AREA': chunk['AREA'],
+            'CRM CD': chunk['Crm Cd'],
+        })
+        incidents = incidents[(incidents['DATE'] >= start) & (incidents['DATE'] <= end)]
+        partials.append(incidents.groupby(levels, sort=False).size().astype('int32'))
+        if len(partials) > 32: # memory is bounded by the size of the cube, not by the number of incidents read
+            partials = [pd.concat(partials).groupby(level=levels, sort=False).sum()]
+    cube = pd.concat(partials).groupby(level=levels, sort=True).sum() if partials else pd.Series(dtype='int32', index=pd.MultiIndex.from_arrays([pd.DatetimeIndex([])] + [[]] * (len(levels) - 1), names=levels))
+    elapsed = time.perf_counter() - started
+    print(f'Read {rows:,} crime incidents in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec), {len(cube):,} cube cells')
+    return cube.rename('CRIME').to_frame()
+
+def crime_daily(crime):
+    # daily crime counts, from either the daily counts of the query endpoint or an incident cube (summed over hours, areas and crime codes)
+    if crime.index.nlevels == 1:
+        return crime
+    return crime.groupby(level='DATE', sort=True).sum()
+
+def check_days(crime, start, end):
+    # raises when daily crime counts are missing for days in [start, end], e.g. after an incomplete web scrape, so the stage is retried
+    missing = len(pd.date_range(start, end)) - len(crime.loc[start:end])
+    if missing > 0:
+        raise ValueError(f'crime counts missing for {missing} days')
+    return crime
+
+def load_crimedata(start=START_DATE, end=END_DATE, ttl=CACHE_TTL, incidents=None):
+    # data source 2 from the cache, or from the web (incident .CSV if given) when stale
+    if incidents:
+        frame = load_source(source_keys(start, end, None, incidents)['crime'], lambda: read_crime_incidents(incidents, start, end), ttl)
+    else: # checked before caching, an incomplete result is refetched by the stage retry instead of being cached
+        frame = load_source(source_keys(start, end, None)['crime'], lambda: check_days(get_crimedata(start, end), start, end), ttl)
+    print('.'*6, 'Collecting Crime data - 100% Complete', '.'*5)
+    return frame
+
+def month_windows(start, end):
+    # splits the date range [start, end] into calendar month windows of (start, end) date strings
+    windows = []
+    for w_start in pd.date_range(start, end, freq='MS').union([pd.Timestamp(start)]):
+        w_end = min(w_start + pd.offsets.MonthEnd(0), pd.Timestamp(end))
+        windows.append((w_start.strftime('%Y-%m-%d'), w_end.strftime('%Y-%m-%d')))
+    return windows
+
+async def fetch_donki_async(start=START_DATE, end=END_DATE, url=DONKI_API_URL, api_key=NASA_API_KEY, workers=HTTP_WORKERS):
+    # requests every event type x month window concurrently over one pooled session, each response body is parsed once
+    with http_session(workers) as session:
+        limit = asyncio.Semaphore(workers) # bounds in-flight requests to the size of the connection pool
+
+        async def fetch(event, w_start, w_end):
+            async with limit:
+                r = await asyncio.to_thread(session.get, url + event, params={'startDate': w_start, 'endDate': w_end, 'api_key': api_key}, timeout=60)
+            r.raise_for_status()
+            return event, (r.json() if r.text.strip() else []) # DONKI returns an empty body for windows without events
+
+        results = await asyncio.gather(*(fetch(event, w_start, w_end) for event in DONKI_EVENTS for w_start, w_end in month_windows(start, end)))
+    events = {event: [] for event in DONKI_EVENTS}
+    for event, records in results:
+        events[event].extend(records)
+    return events
+
+@profiled('fetch donki', 'fetch')
+def fetch_donki(start=START_DATE, end=END_DATE, **kwargs):
+    # synchronous entry point for fetch_donki_async(), returns {'FLR': [...], 'GST': [...], 'CME': [...]} lists of event records
+    return asyncio.run(fetch_donki_async(start, end, **kwargs))
+
+def donki_dates(times):
+    # vectorized conversion of DONKI timestamps (e.g. 2021-05-07T18:59Z) to calendar dates
+    return pd.to_datetime(times.str.slice(0, 10), format='%Y-%m-%d')
+
+@profiled('parse donki', 'parse')
+def parse_donki(events):
+    # builds df_flr, df_gst and df_cme from already parsed DONKI event records
     # build Solar Flare dataframe
-    df_flr = pd.DataFrame(list(zip(flr_date, flr_class, flr_scale)), columns=['DATE', 'FLR Class', 'FLR Scale'])
-    df_flr['DATE'] = pd.to_datetime(df_flr['DATE']) # requirement to sort by date in a panda dataframe
-    df_flr = df_flr.sort_values(by = ['DATE', 'FLR Class', 'FLR Scale'], ascending = [True, True, True])
-    df_flr = df_flr.drop_duplicates(subset=['DATE'], keep='last') # removes duplicates, and accepts only the highest reported class/scale event
-    df_flr = df_flr.set_index('DATE')
-    
+    raw = pd.DataFrame.from_records(events['FLR'], columns=['flrID', 'beginTime', 'classType']).drop_duplicates('flrID') # events on a window boundary may be returned twice
+    flr = pd.DataFrame({
+        'DATE': donki_dates(raw['beginTime']),
+        'FLR Class': raw['classType'].str.slice(0, 1).astype(MERGE_SCHEMA['FLR Class']),
+        'FLR Scale': pd.to_numeric(raw['classType'].str.slice(1), errors='coerce').astype('float32'),
+    })
+    flr['FLR Flux'] = flare_flux(flr['FLR Class'], flr['FLR Scale'])
+    flr = reduce_daily(flr.set_index('DATE'), 'FLR Flux') # accepts only the strongest flare of the day (e.g. X1.2 over M9.8)
+
     # build Geomagnetic Storm dataframe
-    df_gst = pd.DataFrame(list(zip(gst_date, gst_index)), columns=['DATE', 'GST Index'])
-    df_gst['DATE'] = pd.to_datetime(df_gst['DATE']) # requirement to sort by date in a panda dataframe
-    df_gst = df_gst.set_index('DATE')
-    
+    raw = pd.DataFrame.from_records(events['GST'], columns=['gstID', 'startTime', 'allKpIndex']).drop_duplicates('gstID')
+    gst = pd.DataFrame({'DATE': donki_dates(raw['startTime']), 'GST Index': np.array([kp[0].get('kpIndex') for kp in raw['allKpIndex']], dtype='float32')})
+    gst = reduce_daily(gst.set_index('DATE'), 'GST Index') # strongest geomagnetic storm of the day
+
     # build Coronal Mass Ejection dataframe
-    df_cme = pd.DataFrame(list(zip(cme_date, cme_class)), columns=['DATE', 'CME Class'])       
-    df_cme['DATE'] = pd.to_datetime(df_cme['DATE']) # requirement to sort by date in a panda dataframe
-    df_cme = df_cme.sort_values(by = ['DATE', 'CME Class'], ascending = [True, True])
-    df_cme = df_cme.drop_duplicates(subset=['DATE'], keep='last') # removes duplicates, and accepts only the highest reported class event
-    df_cme = df_cme.set_index('DATE') 
-
-def merge_frames():
-    # Merges Solar Flare, Geomagnetic Storm, and Coronal Mass Ejection dataframes with df into Merge
-    global merge, df, df_flr, df_gst, df_cme
-    merge = pd.merge(df, df_flr, how="left", on='DATE') # merges dataframes from datasource # 3 into main dataframe (merge)
-    merge = pd.merge(merge, df_gst, how="left", on='DATE')
-    merge = pd.merge(merge, df_cme, how="left", on='DATE')
-    # saves merge dataframe to merge.csv, to reduce overhead when program called repeatedly
+    raw = pd.DataFrame.from_records(events['CME'], columns=['activityID', 'startTime', 'cmeAnalyses']).drop_duplicates('activityID')
+    raw = raw[raw['cmeAnalyses'].notna()] # excludes empty/incomplete datasets found within donki
+    cme = pd.DataFrame({'DATE': donki_dates(raw['startTime']), 'CME Class': pd.Categorical([analyses[0].get('type') for analyses in raw['cmeAnalyses']], dtype=MERGE_SCHEMA['CME Class'])})
+    cme = reduce_daily(cme.set_index('DATE'), 'CME Class') # accepts only the highest reported class event, by strength (S to ER) not alphabetically
+    return flr, gst, cme
+
+def load_donki(start=START_DATE, end=END_DATE, ttl=CACHE_TTL):
+    # data source 3 from the cache, or from the API when any event type is stale, returns (flr, gst, cme)
+    keys = [source_keys(start, end, None)[event] for event in DONKI_EVENTS]
+    frames = [cache_load(key, ttl) for key in keys]
+    if any(frame is None for frame in frames):
+        print('.'*6, 'Collecting Space Weather data', '.'*6) # progress indicator
+        frames = parse_donki(fetch_donki(start, end))
+        for key, frame in zip(keys, frames):
+            cache_store(key, frame)
+    print('.'*6, 'Collecting Space Weather data - 100% complete', '.'*5) # progress indicator
+    return tuple(frames)
+
+def flare_flux(classes, scales):
+    # peak X-ray flux (W/m2) of solar flares from their ordered FLR Class and FLR Scale, e.g. M3.9 = 3.9 x 1e-5
+    codes = classes.cat.codes.to_numpy()
+    flux = np.where(codes >= 0, 10.0 ** (codes.astype('float64') - 8), np.nan) * scales.to_numpy(dtype='float64', na_value=np.nan)
+    return pd.Series(flux, index=classes.index, dtype='float32')
+
+def typed_frame(frame):
+    # applies MERGE_SCHEMA to the columns of frame, e.g. a stored dataset written by an earlier version, deriving FLR Flux if missing
+    frame = frame.astype({column: dtype for column, dtype in MERGE_SCHEMA.items() if column in frame})
+    if 'FLR Class' in frame and 'FLR Flux' not in frame:
+        frame.insert(frame.columns.get_loc('FLR Scale') + 1 if 'FLR Scale' in frame else len(frame.columns), 'FLR Flux', flare_flux(frame['FLR Class'], frame['FLR Scale']))
+    return frame
+
+def untyped_bytes(frame):
+    # memory frame would use with float64 numbers and object strings, the layout of the dataset before MERGE_SCHEMA, counted without converting it
+    total = frame.index.memory_usage()
+    for column, dtype in frame.dtypes.items():
+        total += 8 * len(frame) # float64 value or object pointer
+        if isinstance(dtype, pd.CategoricalDtype): # plus the str object of every value, or a float NaN object
+            sizes = np.array([sys.getsizeof(str(category)) for category in dtype.categories] + [sys.getsizeof(np.nan)])
+            total += int(sizes[frame[column].cat.codes.to_numpy()].sum()) # code -1 (missing) picks the NaN size
+    return int(total)
+
+def reduce_daily(frame, by=None):
+    # one row per day, the row with the largest value of column by (ordered categoricals by strength), with one group reduction instead of sorting
+    if frame.index.is_unique:
+        return frame
+    if by not in frame:
+        return frame[~frame.index.duplicated(keep='last')]
+    values = frame[by]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        key = values.cat.codes.to_numpy() # -1 for missing, below every class
+    else:
+        key = values.to_numpy(dtype='float64', na_value=-np.inf)
+    positions = pd.Series(key).groupby(frame.index.to_numpy(), sort=True).idxmax() # the Series is positional, so idxmax returns row positions
+    return frame.iloc[positions.to_numpy()]
+
+def join_daily(sources, days=None):
+    # aligns (frame, by) sources on one dense daily DatetimeIndex (default: the days of the first source), each reduced to a row per day by column by
+    frames = [reduce_daily(frame, by) for frame, by in sources]
+    if days is None:
+        days = pd.date_range(frames[0].index.min(), frames[0].index.max(), name='DATE') if len(frames[0]) else pd.DatetimeIndex([], name='DATE')
+    return pd.concat([frame.reindex(days) for frame in frames], axis=1) # indexes are identical, so columns are placed side by side without hash matching
+
+@profiled('merge', 'merge')
+def merge_frames(weather, crime, flr, gst, cme, start=None, end=None):
+    # Merges crime, Solar Flare, Geomagnetic Storm, and Coronal Mass Ejection dataframes with the weather into one dataset, one row per day from start to end
+    days = pd.date_range(start, end, name='DATE') if start and end else None # without a range, the days of the weather
+    merge = join_daily([(weather, None), (crime_daily(crime), None), (flr, 'FLR Flux'), (gst, 'GST Index'), (cme, 'CME Class')], days)
+    missing = merge['CRIME'].isna().sum()
+    if missing:
+        print(f'WARNING: crime counts missing for {missing} days')
+    merge = typed_frame(merge) # reindexing turns integer columns with missing days into float64
+    print(f'Merged dataset: {len(merge):,} days, {merge.memory_usage(deep=True).sum() / 1024:,.1f} KiB ({untyped_bytes(merge) / 1024:,.1f} KiB untyped)')
+    return merge
+
+# one step of run_pipeline(), run(**results of the stages in depends) returns the stage result, e.g. a frame
+Stage = namedtuple('Stage', ['name', 'run', 'depends', 'retries', 'backoff'], defaults=[(), STAGE_RETRIES, STAGE_BACKOFF])
+
+class StageError(RuntimeError):
+    pass
+
+def run_stage(stage, inputs):
+    # runs one stage, retrying only this stage with exponential backoff when it raises
+    with profile_span(stage.name, 'stage') if PROFILE is not None else contextlib.nullcontext():
+        for attempt in range(stage.retries + 1):
+            try:
+                result = stage.run(**inputs)
+                profile_count('rows', frame_rows(result))
+                return result
+            except Exception as error:
+                if attempt == stage.retries or isinstance(error, STAGE_NOT_RETRIED):
+                    raise StageError(f'stage {stage.name} failed after {attempt + 1} attempts: {error}') from error
+                delay = stage.backoff * 2 ** attempt
+                print(f'Stage {stage.name} failed ({error}), retry {attempt + 1}/{stage.retries} in {delay:.0f}s')
+                profile_count('retries')
+                time.sleep(delay)
+
+def run_pipeline(stages, workers=None):
+    # runs each stage once the stages it depends on finished, independent stages concurrently in a thread pool, returns {name: result}
+    pending = {stage.name: stage for stage in stages}
+    results, running = {}, {}
+    with ThreadPoolExecutor(max_workers=workers or len(stages)) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dependency in results for dependency in stage.depends):
+                    running[pool.submit(run_stage, stage, {dependency: results[dependency] for dependency in stage.depends})] = name
+                    del pending[name]
+            if not running:
+                raise StageError(f'unresolvable stage dependencies: {", ".join(pending)}')
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result() # a stage that exhausted its retries stops the pipeline
+    return results
+
+def source_keys(start=START_DATE, end=END_DATE, weather=WEATHER_CSV, incidents=None):
+    # cache keys of every source, a changed date range, endpoint or input file yields a new key (weather=None skips reading the weather files, for the keys of the other sources)
+    files = [(os.path.abspath(path), os.path.getmtime(path), os.path.getsize(path)) for path in weather_files(weather)] if weather else None
+    if incidents:
+        path = (os.path.abspath(incidents), os.path.getmtime(incidents), os.path.getsize(incidents)) if os.path.exists(incidents) else incidents
+        crime = cache_key('crime-incidents', path=path, levels=CRIME_CUBE_LEVELS, start=start, end=end)
+    else:
+        crime = cache_key('crime', url=CRIME_API_URL, start=start, end=end)
+    return {
+        'weather': cache_key('weather', files=files, start=start, end=end),
+        'crime': crime,
+        **{event: cache_key(event, url=DONKI_API_URL, start=start, end=end, schema=DONKI_SCHEMA) for event in DONKI_EVENTS},
+    }
+
+def dataset_stages(start=START_DATE, end=END_DATE, ttl=CACHE_TTL, weather=WEATHER_CSV, incidents=None):
+    # pipeline building the merged dataset, weather, crime and space weather are fetched concurrently
+    keys = source_keys(start, end, weather, incidents)
+
+    def merge_stage(weather, crime, donki):
+        merge = merge_frames(weather, crime, *donki, start=start, end=end)
+        cache_store(cache_key('merge', sources=[cache_meta(key, None)['digest'] for key in keys.values()], start=start, end=end), merge)
+        return merge
+
+    return [
+        Stage('weather', lambda: load_weatherdata(start, end, ttl, weather)),
+        Stage('crime', lambda: load_crimedata(start, end, ttl, incidents)),
+        Stage('donki', lambda: load_donki(start, end, ttl)),
+        Stage('merge', merge_stage, depends=('weather', 'crime', 'donki'), retries=0),
+    ]
+
+@profiled('load dataset', 'cache')
+def load_merged(start=START_DATE, end=END_DATE, ttl=CACHE_TTL, weather=WEATHER_CSV, incidents=None):
+    # returns the merged dataset, refetching only the sources whose cache entry is missing or expired
+    keys = source_keys(start, end, weather, incidents)
+    metas = [cache_meta(key, ttl) for key in keys.values()]
+    if all(metas): # the merged frame is addressed by the content of its sources and its date range, so it is reused until one of them is refetched
+        merge = cache_load(cache_key('merge', sources=[meta['digest'] for meta in metas], start=start, end=end), ttl=None)
+        if merge is not None:
+            print('Datasets gathered previously.\nLoading from cache\n')
+            return merge
+    print('Initializing collection of datasets.\n', '.'*6, 'Please wait.', '.'*6)
+    return run_pipeline(dataset_stages(start, end, ttl, weather, incidents))['merge']
+
+def cache_key(source, **params):
+    # content address of a cache entry, derived from the source name and its parameters (e.g. date range)
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return f"{source}-{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+def frame_digest(frame):
+    # digest of a frame's contents, used to address frames derived from it
+    digest = hashlib.sha256(','.join(map(str, frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    return digest.hexdigest()[:16]
+
+def cache_meta(key, ttl=CACHE_TTL):
+    # returns the metadata of a cache entry, or None if it is missing or older than ttl seconds (ttl=None never expires)
     try:
-        merge.to_csv(r'merge.csv')
-    except:
-        pass
+        with open(os.path.join(CACHE_DIR, key + '.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if ttl is not None and time.time() - meta['created'] > ttl:
+        return None
+    if not os.path.exists(os.path.join(CACHE_DIR, meta['file'])):
+        return None
+    return meta
 
-def show_graph():
-    # called with the --graph system argument, displays 9 graphs of associated datasets.
-    
-    global merge
-    
-    print('Building line graphs from 9 distinct datasets.\n', '.'*6, 'Please Wait', '.'*6, '\n')
-    
-    fig, ax = plt.subplots(9, 1, figsize=(32, 20), tight_layout=True) # [rows, columns]
-    fig.subplots_adjust(top=0.8)
-    myFmt = mdates.DateFormatter('%b %d')
-    
-    # graph 1 - Crime vs PRCP
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[0], color='red', label='Crime')
-    ax1 = ax[0].twinx() # used to overlay two datasets on the same table
-    sns.lineplot(data=merge, x='DATE', y='PRCP', ax=ax1, color='blue', label='PRCP')
-    ax[0].set_title("Crime vs Precipitation")
-    ax[0].legend(loc='upper right')
-    ax1.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80)) # offsets 2nd legend, so as not to overlap
-    ax[0].xaxis.set_major_formatter(myFmt)
-    ax[0].xaxis.set_major_locator(mdates.MonthLocator(interval=1)) # formats x-axis by month
-    ax1.spines["right"].set_color('blue')
-    
-    # graph 2 - Crime vs TMAX/TMIN
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[1], color='red', label='Crime')
-    ax2 = ax[1].twinx()
-    sns.lineplot(data=merge, x='DATE', y='TMAX', ax=ax2, color='blue', label='TMAX')
-    sns.lineplot(data=merge, x='DATE', y='TMIN', ax=ax2, color='green', label='TMIN')
-    ax[1].set_title("Crime vs Temperature Max (TMAX, TMIN)")    
-    ax[1].legend(loc='upper right')
-    ax2.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[1].xaxis.set_major_formatter(myFmt)
-    ax[1].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-        
-    # graph 3 - Crime vs AWND
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[2], color='red', label='Crime')
-    ax4 = ax[2].twinx()
-    sns.lineplot(data=merge, x='DATE', y='AWND', ax=ax4, color='blue', label='AWND')
-    ax[2].set_title("Crime vs Average Daily Wind Speed (AWND)")    
-    ax[2].legend(loc='upper right')
-    ax4.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[2].xaxis.set_major_formatter(myFmt)
-    ax[2].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    ax4.spines["right"].set_color('blue')
-         
-    # graph 4 - Crime vs WSF2/WSF5
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[3], color='red', label='Crime')
-    ax5 = ax[3].twinx()
-    sns.lineplot(data=merge, x='DATE', y='WSF2', ax=ax5, color='blue', label='WSF2')
-    sns.lineplot(data=merge, x='DATE', y='WSF5', ax=ax5, color='green', label='WSF5')
-    ax[3].set_title("Crime vs Fastest 2-minute (WSF2) and 5-second (WSF5) wind speed")    
-    ax[3].legend(loc='upper right')
-    ax5.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[3].xaxis.set_major_formatter(myFmt)
-    ax[3].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-        
-    # graph 5 - Crime vs WT01/WT02
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[4], color='red', label='Crime')
-    ax7 = ax[4].twinx()
-    sns.lineplot(data=merge, x='DATE', y='WT01', ax=ax7, color='blue', label='WT01')
-    sns.lineplot(data=merge, x='DATE', y='WT02', ax=ax7, color='green', label='WT02')
-    ax[4].set_title("Crime vs Weather Conditions:  WT01 (fog, ice fog, freezing fog),  WT02 (heavy fog)")    
-    ax[4].legend(loc='upper right')
-    ax7.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[4].xaxis.set_major_formatter(myFmt)
-    ax[4].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-        
-    # graph 6 - Crime vs WT08
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[5], color='red', label='Crime')
-    ax9 = ax[5].twinx()
-    sns.lineplot(data=merge, x='DATE', y='WT08', ax=ax9, color='blue', label='WT08')
-    ax[5].set_title("Crime vs Weather Condition WT08 (smoke or haze)")    
-    ax[5].legend(loc='upper right')
-    ax9.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[5].xaxis.set_major_formatter(myFmt)
-    ax[5].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    ax9.spines["right"].set_color('blue')
-        
-    # graph 7 - Crime vs FLR
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[6], color='red', label='Crime')
-    ax10 = ax[6].twinx()
-    ax11 = ax[6].twinx()
-    sns.lineplot(data=merge, x='DATE', y='FLR Class', ax=ax10, color='blue', label='FLR Class')
-    sns.lineplot(data=merge, x='DATE', y='FLR Scale', ax=ax11, color='green', label='FLR Scale')
-    ax[6].set_title("Crime vs Solar Flares (FLR Class, FLR Scale)")    
-    ax[6].legend(loc='upper right')
-    ax10.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax11.legend(loc='upper right', bbox_to_anchor=(1.0, 0.60))
-    ax[6].xaxis.set_major_formatter(myFmt)
-    ax[6].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    ax10.spines["right"].set_color('blue')
-    ax11.spines["right"].set_color('green')
-    ax11.spines["right"].set_position(("axes", +1.025)) # offsets 2nd y-axis
-        
-    # graph 8 - Crime vs GST
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[7], color='red', label='Crime')
-    ax12 = ax[7].twinx()
-    sns.lineplot(data=merge, x='DATE', y='GST Index', ax=ax12, color='blue', label='GST Index')
-    ax[7].set_title("Crime vs Geomagnetic Storms (GST Index)")    
-    ax[7].legend(loc='upper right')
-    ax12.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[7].xaxis.set_major_formatter(myFmt)
-    ax[7].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    ax12.spines["right"].set_color('blue')
-        
-    # graph 9 - Crime vs CME
-    sns.lineplot(data=merge, x='DATE', y='CRIME', ax=ax[8], color='red', label='Crime')
-    ax13 = ax[8].twinx()
-    sns.lineplot(data=merge, x='DATE', y='CME Class', ax=ax13, color='blue', label='CME Class')
-    ax[8].set_title("Crime vs Coronal Mass Ejection (CME Class)")    
-    ax[8].legend(loc='upper right')
-    ax13.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80))
-    ax[8].xaxis.set_major_formatter(myFmt)
-    ax[8].xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    ax13.spines["right"].set_color('blue')
-        
-    fig.suptitle("Daily comparison of local and space weather to crime reports in Los Angeles 2021", y=1.0)
-    plt.show()    
-
-def show_stats():
-    # called with the --stats system argument, provides datasets above and below the mean for analysis.
-    global merge
-    merge_above_mean = merge # test dataframe
-    merge_below_mean = merge
-    mean_values = []
-    # includes crime, awnd, prcp, tmax, tmin, wsf2, wsf5, wt01, wt02
-    labels = ['CRIME', 'AWND', 'PRCP', 'TMAX', 'TMIN', 'WSF2', 'WSF5', 'WT01', 'WT02', 'FLR Class', 'GST Index', 'CME Class']
-    
-    for i in range(len(labels)): # iterates through labels to identify mean values for each column in list "labels"
-        if i >= 7 and i < 9: # WT01, WT02
-            mean_values.append(0) # wt01_mean and wt02_mean NOT needed, as binary value, anything greater than 0
-        elif i >= 9: # FLR, GST, CME
-            continue # replace with NaN
-        else: # CRIME, AWND, PRCP, TMAX, TMIN, WSF2, WSF5
-            mean_values.append(merge.loc[:, labels[i]].mean())
-    
-    for i in range(len(labels)-1): # range of 12-1
-        if i < 8:
-            # build DF for values above mean
-            merge_above_mean = merge
-            merge_above_mean = merge_above_mean[merge_above_mean.loc[:, labels[0]] > mean_values[0]] # CRIME above mean
-            merge_above_mean = merge_above_mean[merge_above_mean.loc[:, labels[i+1]] > mean_values[i+1]] # second variable above mean
-            merge_above_mean.reset_index(drop=True, inplace=True)
-            print(f'\n\nThere were {len(merge_above_mean.index)} days where {labels[0]} and {labels[i+1]} were above the mean.')
-            
-            # build DF for values below mean
-            merge_below_mean = merge
-            merge_below_mean = merge_below_mean[merge_below_mean.loc[:, labels[0]] > mean_values[0]] # CRIME above mean
-            merge_below_mean = merge_below_mean[merge_below_mean.loc[:, labels[i+1]] <= mean_values[i+1]] # second variable below mean
-            merge_below_mean.reset_index(drop=True, inplace=True)
-            print(f'There were {len(merge_below_mean.index)} days where {labels[0]} and {labels[i+1]} were below the mean.')
-            print(f'{labels[0]} mean: {mean_values[0]:.2f}')
-            print(f'{labels[i+1]} mean: {mean_values[i+1]:.2f}')
-            print(f'\n{labels[0]} and {labels[i+1]} above the mean dataset.')
-            display(merge_above_mean)
-            print(f'\n{labels[0]} and {labels[i+1]} below the mean dataset.')
-            display(merge_below_mean)
-            
-        else:
-            # build DF for values above mean
-            merge_above_mean = merge
-            merge_above_mean = merge_above_mean[merge_above_mean.loc[:, labels[0]] > mean_values[0]] # CRIME above mean
-            merge_above_mean = merge_above_mean[merge_above_mean[labels[i+1]].notna()] # filters on NaN for FLR, GST, CME events
-            merge_above_mean.reset_index(drop=True, inplace=True)
-            print(f'\n\nThere were {len(merge_above_mean.index)} days where both {labels[0]} and {labels[i+1]} were above the mean.')
-            
-            # build DF for values below mean
-            merge_below_mean = merge
-            merge_below_mean = merge_below_mean[merge_below_mean.loc[:, labels[0]] > mean_values[0]] # CRIME above mean
-            merge_below_mean = merge_below_mean[merge_below_mean[labels[i+1]].isna()] # filters on NaN for FLR, GST, CME events
-            merge_below_mean.reset_index(drop=True, inplace=True)
-            print(f'There were {len(merge_below_mean.index)} days where {labels[0]} and {labels[i+1]} were below the mean.')
-            print(f'{labels[0]} mean: {mean_values[0]:.2f}')
-            print(f'\n{labels[0]} and {labels[i+1]} above the mean dataset.')
-            display(merge_above_mean)
-            print(f'\n{labels[0]} and {labels[i+1]} below the mean dataset.')
-            display(merge_below_mean)
-    
-def show_table(self):
-    # prints N number of rows to the terminal, based on optional sysarg --scrape
-    global merge
-    display(merge.head(self))
-
-def save_csv(self):
-    # saves dataframe (merge) to .CSV, based on optional sysarge --save
-    global merge
+def cache_load(key, ttl=CACHE_TTL):
+    # returns the cached frame stored under key, or None on a miss or expired entry
+    meta = cache_meta(key, ttl)
+    if meta is None:
+        profile_count('cache miss')
+        return None
+    try:
+        frame = read_frame(os.path.join(CACHE_DIR, meta['file']))
+    except Exception:
+        profile_count('cache miss')
+        return None # unreadable entry, e.g. written with a different pandas/pyarrow version
+    profile_count('cache hit')
+    os.utime(os.path.join(CACHE_DIR, key + '.json')) # marks the entry as recently used for eviction
+    return frame
+
+def cache_store(key, frame):
+    # writes frame under key as Parquet (pickle if pyarrow is not installed), then evicts entries beyond CACHE_MAX_BYTES
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = write_frame(os.path.join(CACHE_DIR, key), frame)
+    name = os.path.basename(path)
+    meta = {'key': key, 'file': name, 'created': time.time(), 'digest': frame_digest(frame), 'rows': len(frame), 'bytes': os.path.getsize(path)}
+    with open(os.path.join(CACHE_DIR, key + '.json.tmp'), 'w') as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(CACHE_DIR, key + '.json.tmp'), os.path.join(CACHE_DIR, key + '.json'))
+    cache_evict()
+    return meta
+
+def cache_evict(max_bytes=CACHE_MAX_BYTES):
+    # removes least recently used cache entries until the cache fits in max_bytes
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(CACHE_DIR, name)) as f:
+                    meta = json.load(f)
+                entries.append((os.path.getmtime(os.path.join(CACHE_DIR, name)), meta))
+            except (OSError, ValueError):
+                continue
+    entries.sort(key=lambda entry: entry[0], reverse=True) # most recently used first
+    total = 0
+    for used, meta in entries:
+        total += meta['bytes']
+        if total > max_bytes:
+            for name in (meta['file'], meta['key'] + '.json'):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, name))
+                except OSError:
+                    pass
+
+def write_frame(path, frame):
+    # writes frame to path + .parquet (.pkl if pyarrow is not installed) and returns the file name
+    path += '.parquet' if importlib.util.find_spec('pyarrow') else '.pkl'
+    if path.endswith('.parquet'):
+        frame.to_parquet(path + '.tmp')
+    else:
+        frame.to_pickle(path + '.tmp', compression=None)
+    os.replace(path + '.tmp', path) # atomic, readers never see a partially written file
+    return path
+
+def read_frame(path):
+    # reads a frame written by write_frame(), both formats keep dtypes so DATE is not re-parsed
+    return pd.read_parquet(path, memory_map=True) if path.endswith('.parquet') else pd.read_pickle(path)
+
+def load_source(key, fetch, ttl=CACHE_TTL):
+    # returns the frame cached under key, or calls fetch() and caches its result on a miss or expired entry
+    frame = cache_load(key, ttl)
+    if frame is None:
+        frame = fetch()
+        cache_store(key, frame)
+    return frame
+
+def load_watermarks():
+    # last ingested day of each source, recorded by refresh_dataset()
+    try:
+        with open(os.path.join(DATA_DIR, 'watermarks.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_watermarks(marks):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(os.path.join(DATA_DIR, 'watermarks.json.tmp'), 'w') as f:
+        json.dump(marks, f, indent=4)
+    os.replace(os.path.join(DATA_DIR, 'watermarks.json.tmp'), os.path.join(DATA_DIR, 'watermarks.json'))
+
+def store_parts():
+    # file paths of the stored dataset, oldest first
+    path = os.path.join(DATA_DIR, 'merged')
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.startswith('part-') and not name.endswith('.tmp'))
+
+def append_store(frame):
+    # appends rows to the stored dataset as a new part, so a refresh writes only the new days
+    os.makedirs(os.path.join(DATA_DIR, 'merged'), exist_ok=True)
+    write_frame(os.path.join(DATA_DIR, 'merged', time.strftime('part-%Y%m%d%H%M%S-') + f'{len(store_parts()):05d}'), frame)
+
+@profiled('read store', 'cache')
+def read_store():
+    # reads the stored dataset, values of later parts override earlier ones for the same DATE (e.g. crime counts arriving after the weather)
+    parts = store_parts()
+    if not parts:
+        return None
+    store = pd.concat([read_frame(path) for path in parts])
+    if len(parts) > 1:
+        store = store.groupby(level='DATE', sort=True).last() # last non-null value per column and day
+    store = typed_frame(store) # parts written before MERGE_SCHEMA hold strings and float64
+    if len(parts) > STORE_MAX_PARTS: # compaction, keeps reads fast after many daily refreshes
+        append_store(store)
+        for path in parts:
+            os.remove(path)
+    return store
+
+@profiled('refresh dataset', 'cache')
+def refresh_dataset(start=START_DATE, end=None, ttl=CACHE_TTL, weather=WEATHER_CSV):
+    # --refresh, fetches only days newer than each source's watermark and appends them to the stored dataset
+    end = end or (pd.Timestamp.today() - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    marks = load_watermarks()
+    store = read_store()
+    if marks is None or store is None: # first run, the stored dataset is seeded with the requested date range, from the cache when possible
+        store = load_merged(start, end, ttl, weather)
+
+        def last_day(frame):
+            # last day with a value, or the day before start for a source without any, so it is refetched from start
+            day = frame.dropna(how='all').index.max()
+            return (pd.Timestamp(start) - pd.Timedelta(days=1) if pd.isna(day) else day).strftime('%Y-%m-%d')
+
+        marks = {'weather': last_day(store[WEATHER_COLUMNS]), 'crime': last_day(store[['CRIME']]), 'donki': end}
+        if len(store):
+            append_store(store)
+        save_watermarks(marks)
+    print('Refreshing datasets, last ingested days:', ', '.join(f'{source} {day}' for source, day in marks.items()))
+
+    def since(source):
+        return (pd.Timestamp(marks[source]) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def fetch_donki_days(start, end):
+        return list(parse_donki(fetch_donki(start, end))) # one row per day of each event type, so the frames align
+
+    stages = [Stage(source, lambda fetch=fetch, source=source: fetch(since(source), end))
+              for source, fetch in [('weather', fetch_weatherdata), ('crime', get_crimedata), ('donki', fetch_donki_days)] if since(source) <= end]
+    fetched = run_pipeline(stages) if stages else {} # sources are fetched concurrently, each retried on its own
+    first = min(since(stage.name) for stage in stages) if stages else None # earliest day refetched, before the watermarks move
+    new = []
+    for source in [stage.name for stage in stages]: # in stage order, completion order would shuffle the columns
+        frames = fetched[source]
+        new.extend(frames if source == 'donki' else [frames])
+        if source == 'donki':
+            marks['donki'] = end # days without space weather events are complete as well
+        elif len(frames):
+            marks[source] = frames.index.max().strftime('%Y-%m-%d')
+    # new days only, from the earliest day refetched, days without any new value are not appended
+    rows = join_daily([(frame, None) for frame in new], pd.date_range(first, end, name='DATE')).dropna(how='all') if new else None
+    if rows is not None and len(rows):
+        append_store(rows)
+        store = read_store()
+        print(f'Appended {len(rows)} days to the stored dataset.')
+    else:
+        print('Stored dataset is up to date.')
+    save_watermarks(marks) # written after the new rows, a failed refresh is retried from the previous watermarks
+    return store
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets decimation, keeps the points that preserve the visual shape of a long series
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int) # threshold - 2 buckets between the first and last point
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+def panel_series(merge, column, max_points=GRAPH_MAX_POINTS):
+    # x (matplotlib date numbers) and y values of a column without missing days, decimated to max_points, and y tick labels for class columns
+    import matplotlib.dates as mdates
+    values = merge[column]
+    labels = None
+    if isinstance(values.dtype, pd.CategoricalDtype): # classes are plotted as their rank in strength, instead of categorically in order of appearance
+        labels = list(values.cat.categories)
+        numeric = values.cat.codes.where(values.notna())
+    else:
+        numeric = pd.to_numeric(values, errors='coerce')
+    dates = merge['DATE'] if 'DATE' in merge else merge.index.to_series()
+    x = mdates.date2num(pd.to_datetime(dates).to_numpy())
+    y = numeric.to_numpy(dtype='float64')
+    present = ~np.isnan(y)
+    x, y = lttb(x[present], y[present], max_points)
+    return x, y, labels
+
+def draw_panel(ax, panel, series):
+    # draws one panel of GRAPH_PANELS on ax: CRIME in red, each group of panel['axes'] on its own twin y-axis
+    import matplotlib.dates as mdates
+    x, y, _ = series['CRIME']
+    ax.plot(x, y, color='red', label='Crime')
+    ax.set_ylabel('CRIME')
+    for i, group in enumerate(panel['axes']):
+        twin = ax.twinx() # used to overlay two datasets on the same table
+        for column, color in group:
+            x, y, labels = series[column]
+            twin.plot(x, y, color=color, label=column)
+            if column in panel.get('log', []): # e.g. flare flux spans 5 orders of magnitude
+                twin.set_yscale('log')
+            if labels is not None:
+                twin.set_yticks(range(len(labels)), labels)
+        twin.set_ylabel(', '.join(column for column, color in group))
+        twin.legend(loc='upper right', bbox_to_anchor=(1.0, 0.80 - 0.20 * i)) # offsets 2nd legend, so as not to overlap
+        if len(group) == 1:
+            twin.spines["right"].set_color(group[0][1])
+        if i:
+            twin.spines["right"].set_position(("axes", 1.0 + 0.025 * i)) # offsets 2nd y-axis
+    ax.set_title(panel['title'])
+    ax.legend(loc='upper right')
+    x = series['CRIME'][0]
+    if len(x) and x[-1] - x[0] > 550: # multi-year series
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    else:
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1)) # formats x-axis by month
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %d'))
+
+def panel_figure(panel, series):
+    # one panel on its own figure, with the Agg (png) or SVG canvas so no display is required
+    from matplotlib.figure import Figure # pyplot is not used, so no GUI backend is started
+    fig = Figure(figsize=(32, 20 / 9 + 1), layout='tight')
+    draw_panel(fig.add_subplot(), panel, series)
+    return fig
+
+def render_panel(task):
+    # renders one panel to an image file, in a worker of render_graphs()
+    panel, series, path = task
+    panel_figure(panel, series).savefig(path)
+    return path
+
+def render_graphs(merge, out='graphs', fmt='png', workers=None, max_points=GRAPH_MAX_POINTS):
+    # headless --graph, renders every panel of GRAPH_PANELS to its own file in a process pool and returns the file paths
+    os.makedirs(out, exist_ok=True)
+    tasks = []
+    for number, panel in enumerate(GRAPH_PANELS, 1):
+        columns = ['CRIME'] + [column for group in panel['axes'] for column, color in group]
+        series = {column: panel_series(merge, column, max_points) for column in columns}
+        tasks.append((panel, series, os.path.join(out, f'{number}-{panel["name"]}.{fmt}')))
+    if workers == 1:
+        return list(map(render_panel, tasks))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_panel, tasks))
+
+@profiled('graph', 'render')
+def show_graph(merge, out=None, fmt='png', workers=None):
+    # called with the graph command, displays 9 graphs of associated datasets, or writes them to files in out
+    import matplotlib.pyplot as plt
+    print(f'Building line graphs from {len(GRAPH_PANELS)} distinct datasets.\n', '.'*6, 'Please Wait', '.'*6, '\n')
+    if out is None and plt.get_backend().lower() in ('agg', 'svg', 'pdf', 'ps', 'cairo', 'template'): # no display available, e.g. on a server
+        out = 'graphs'
+    if out is not None:
+        paths = render_graphs(merge, out, fmt, workers)
+        print(f'Saved {len(paths)} graphs to {out}')
+        return paths
+    fig, ax = plt.subplots(len(GRAPH_PANELS), 1, figsize=(32, 20), tight_layout=True) # [rows, columns]
+    for axis, panel in zip(ax, GRAPH_PANELS):
+        columns = ['CRIME'] + [column for group in panel['axes'] for column, color in group]
+        draw_panel(axis, panel, {column: panel_series(merge, column) for column in columns})
+    fig.suptitle("Daily comparison of local and space weather to crime reports in Los Angeles", y=1.0)
+    plt.show()
+
+def stats_frame(merge):
+    # numeric view of merge used by the statistics engine, on a dense daily index so row shifts are day lags
+    frame = typed_frame(merge[['CRIME'] + STATS_MEASURES + STATS_FLAGS + STATS_EVENTS]) # numeric columns of MERGE_SCHEMA convert without parsing
+    if isinstance(frame.index, pd.DatetimeIndex):
+        frame = frame[~frame.index.duplicated(keep='last')].asfreq('D')
+    numeric = frame[['CRIME'] + STATS_MEASURES + STATS_FLAGS].astype('float64') # missing values become NaN
+    for column in STATS_EVENTS: # space weather events are present or absent on a day
+        numeric[column] = frame[column].notna().astype('float64')
+    return numeric
+
+def pairwise_corr(x, y):
+    # Pearson correlation of every column of x with every column of y over rows where both are not NaN, as one set of matrix products
+    wx, wy = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.where(wx, x, 0.0), np.where(wy, y, 0.0)
+    wx, wy = wx.astype('float64'), wy.astype('float64')
+    n = wx.T @ wy # pairwise counts of valid rows
+    sx, sy = x0.T @ wy, wx.T @ y0 # sums of x (y) over rows where y (x) is valid
+    sxx, syy = (x0 * x0).T @ wy, wx.T @ (y0 * y0)
+    sxy = x0.T @ y0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    r[n < 3] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+@profiled('stats', 'stats')
+def compute_stats(merge, lags=STATS_LAGS):
+    # statistics engine: above/below mean contingency counts, Pearson/Spearman correlations and lagged cross-correlations with CRIME
+    frame = stats_frame(merge)
+    names = list(frame.columns)
+    X = frame.to_numpy()
+    variables = names[1:]
+    means = np.nanmean(X, axis=0)
+    thresholds = means.copy()
+    thresholds[[names.index(column) for column in STATS_FLAGS + STATS_EVENTS]] = 0 # flags and events are compared with 0 (did not occur), not their mean
+
+    # contingency counts for all variables in one pass, NaN days count as neither above nor below
+    valid = ~np.isnan(X)
+    above = valid & (X > thresholds)
+    below = valid & (X <= thresholds)
+    crime_above, crime_below = above[:, :1].T.astype('int64'), below[:, :1].T.astype('int64')
+    counts = np.vstack([crime_above @ above, crime_above @ below, crime_below @ above, crime_below @ below])[:, 1:]
+
+    pearson = pairwise_corr(X, X)
+    spearman = frame.corr(method='spearman', min_periods=3).to_numpy() # each pair ranked over the days where both are valid, ranks of a whole column would differ on days missing from the other
+    lagged = np.full((lags + 1, len(variables)), np.nan)
+    crime = X[:, :1]
+    for lag in range(lags + 1): # CRIME on day t against each variable on day t - lag
+        if lag < len(X) - 2:
+            lagged[lag] = pairwise_corr(crime[lag:], X[:len(X) - lag, 1:])[0]
+
+    summary = pd.DataFrame({
+        'mean': means[1:],
+        'threshold': thresholds[1:],
+        'crime above, var above': counts[0],
+        'crime above, var below': counts[1],
+        'crime below, var above': counts[2],
+        'crime below, var below': counts[3],
+        'pearson': pearson[0, 1:],
+        'spearman': spearman[0, 1:],
+        'best lag': np.where(np.isnan(lagged).all(axis=0), -1, np.nanargmax(np.nan_to_num(np.abs(lagged), nan=-1.0), axis=0)),
+    }, index=pd.Index(variables, name='variable'))
+    summary['lagged r'] = lagged[summary['best lag'].clip(lower=0), np.arange(len(variables))]
+    return {
+        'days': int(valid[:, 0].sum()),
+        'crime mean': float(means[0]),
+        'summary': summary,
+        'pearson': pd.DataFrame(pearson, index=names, columns=names),
+        'spearman': pd.DataFrame(spearman, index=names, columns=names),
+        'lagged': pd.DataFrame(lagged, index=pd.RangeIndex(lags + 1, name='lag'), columns=variables),
+    }
+
+def stats_json(stats):
+    # JSON document of compute_stats(), NaN correlations are written as null
+    def table(frame):
+        return json.loads(frame.to_json(orient='index'))
+    return json.dumps({'days': stats['days'], 'crime mean': stats['crime mean'], **{name: table(stats[name]) for name in ['summary', 'pearson', 'spearman', 'lagged']}}, indent=2)
+
+def show_stats(merge, fmt='table', lags=STATS_LAGS):
+    # called with the stats command, prints above/below mean counts and correlations of each variable with CRIME
+    stats = compute_stats(merge, lags)
+    if fmt == 'json':
+        print(stats_json(stats))
+        return
+    print(f"{stats['days']} days, CRIME mean: {stats['crime mean']:.2f}\n")
+    print('Days with CRIME above/below its mean, by each variable above/below its mean (weather types and space weather events: occurred/did not occur), with correlation to CRIME:')
+    print(stats['summary'].to_string(float_format=lambda value: f'{value:.3f}'))
+    print('\nCorrelation of CRIME on day t with each variable on day t - lag:')
+    print(stats['lagged'].to_string(float_format=lambda value: f'{value:.3f}'))
+
+def batch_corr(Y, x, C):
+    # Pearson correlation of each row of Y (B x n) with each column of x (n x K), rows weighted by C (B x n), NaN in x excluded pairwise
+    w = ~np.isnan(x)
+    x0 = np.where(w, x, 0.0)
+    w = w.astype('float64')
+    CY = C * Y
+    n, sx, sxx = C @ w, C @ x0, C @ (x0 * x0)
+    sy, syy, sxy = CY @ w, (CY * Y) @ w, CY @ x0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    return np.clip(r, -1.0, 1.0)
+
+def lag_pairs(X, lag):
+    # CRIME on day t (y) and every variable on day t - lag (x), on the days CRIME is known
+    y, x = X[lag:, 0], X[:len(X) - lag, 1:]
+    known = ~np.isnan(y)
+    return y[known], x[known]
+
+def signif_init(X):
+    # process pool initializer, each worker receives the stats matrix once instead of with every batch
+    global signif_matrix
+    signif_matrix = X
+
+def signif_batch(task):
+    # correlations of one batch of resamples for one lag, as a (resamples x variables) matrix
+    lag, kind, batch, size, block, seed = task
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(lag, kind == 'bootstrap', batch))) # same stream for a batch regardless of the worker that runs it
+    y, x = lag_pairs(signif_matrix, lag)
+    n = len(y)
+    if kind == 'permutation': # shuffles CRIME against the variables, as an index matrix of all permutations in the batch
+        order = np.argsort(rng.random((size, n)), axis=1)
+        return batch_corr(y[order], x, np.ones((size, n)))
+    # moving block bootstrap, resamples runs of consecutive days to keep their autocorrelation, applied as counts of each day per resample
+    block = max(1, min(block, n))
+    starts = rng.integers(0, n - block + 1, (size, -(-n // block)))
+    index = (starts[:, :, None] + np.arange(block)).reshape(size, -1)[:, :n]
+    counts = np.bincount((index + np.arange(size)[:, None] * n).ravel(), minlength=size * n).reshape(size, n).astype('float64')
+    return batch_corr(np.broadcast_to(y, (size, n)), x, counts)
+
+@profiled('significance', 'stats')
+def significance_tests(merge, lags=STATS_LAGS, resamples=SIGNIF_RESAMPLES, block=SIGNIF_BLOCK_DAYS, seed=0, workers=None):
+    # permutation p-values and block bootstrap confidence intervals of the correlation of CRIME with each variable at each lag
+    frame = stats_frame(merge)
+    X = frame.to_numpy()
+    variables = list(frame.columns[1:])
+    tasks = [(lag, kind, batch, min(SIGNIF_BATCH, resamples - batch * SIGNIF_BATCH), block, seed)
+             for lag in range(lags + 1) for kind in ('permutation', 'bootstrap') for batch in range(-(-resamples // SIGNIF_BATCH))]
+    if workers == 1:
+        signif_init(X)
+        results = list(map(signif_batch, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=signif_init, initargs=(X,)) as pool:
+            results = list(pool.map(signif_batch, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))))
+    resampled = {}
+    for task, r in zip(tasks, results):
+        resampled.setdefault(task[:2], []).append(r)
+    rows = []
+    for lag in range(lags + 1):
+        y, x = lag_pairs(X, lag)
+        observed = pairwise_corr(y[:, None], x)[0]
+        permuted = np.vstack(resampled[(lag, 'permutation')])
+        bootstrap = np.vstack(resampled[(lag, 'bootstrap')])
+        exceed = (np.abs(permuted) >= np.abs(observed) - 1e-12).sum(axis=0) # two-sided
+        with np.errstate(invalid='ignore'):
+            low, high = np.nanpercentile(bootstrap, [2.5, 97.5], axis=0) if len(bootstrap) else (observed, observed)
+        for i, variable in enumerate(variables):
+            rows.append({'variable': variable, 'lag': lag, 'r': observed[i], 'p': (exceed[i] + 1) / (len(permuted) + 1), 'ci low': low[i], 'ci high': high[i]})
+    result = pd.DataFrame(rows).set_index(['variable', 'lag'])
+    result.loc[result['r'].isna(), 'p'] = np.nan # constant variables, e.g. a weather type that never occurred
+    # Benjamini-Hochberg adjusted p-values, as every variable x lag combination is tested
+    p = result['p'].to_numpy()
+    tested = ~np.isnan(p)
+    order = np.argsort(p[tested])
+    adjusted = p[tested][order] * tested.sum() / np.arange(1, tested.sum() + 1)
+    q = np.full(len(p), np.nan)
+    q[np.flatnonzero(tested)[order]] = np.minimum(1.0, np.minimum.accumulate(adjusted[::-1])[::-1])
+    result['q'] = q
+    return result
+
+def show_significance(merge, fmt='table', lags=STATS_LAGS, resamples=SIGNIF_RESAMPLES, block=SIGNIF_BLOCK_DAYS, seed=0, workers=None):
+    # called with the significance command, prints p-values and confidence intervals of the correlations with CRIME
+    started = time.perf_counter()
+    result = significance_tests(merge, lags, resamples, block, seed, workers)
+    if fmt == 'json':
+        print(json.dumps(json.loads(result.reset_index().to_json(orient='records')), indent=2))
+        return
+    print(f'Correlation of CRIME (day t) with each variable (day t - lag): {resamples} permutations (p), {resamples} block bootstrap resamples of {block} days (95% CI), Benjamini-Hochberg adjusted p (q)')
+    print(result.to_string(float_format=lambda value: f'{value:.4f}'))
+    print(f'\n{(result["q"] < 0.05).sum()} of {len(result)} variable x lag combinations significant at q < 0.05, computed in {time.perf_counter() - started:.2f}s')
+
+def show_table(merge, rows):
+    # prints N number of rows to the terminal, based on the scrape command
+    print(merge.head(rows).to_string())
+
+def save_csv(merge, path):
+    # saves dataframe (merge) to .CSV, based on the save command
     try:
-        merge.to_csv(self)
+        merge.to_csv(path)
         print('Export of dataset successful!')
     except:
         print('Unable to export to .csv, please check permissions')
 
+class LRUCache:
+    # bounded mapping of recently used query results, shared by the threads of the server
+    def __init__(self, size):
+        self.size, self.entries, self.lock = size, OrderedDict(), threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False) # least recently used
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def dataset_signature(args):
+    # changes when the dataset served is rewritten by another run, e.g. a scheduled scraper.py --refresh or an updated weather .CSV
+    if args.refresh:
+        return tuple((path, os.path.getmtime(path)) for path in store_parts())
+    keys = source_keys(args.start, args.end or END_DATE, args.weather, args.crime_incidents)
+    return tuple((meta or {}).get('digest') for meta in (cache_meta(key, None) for key in keys.values()))
+
+def column_stats(frame):
+    # count, mean, std, min, quartiles and max of numeric columns, days per class of categorical columns
+    numeric = frame.select_dtypes(exclude='category')
+    stats = json.loads(numeric.astype('float64').describe().to_json()) if len(numeric.columns) else {}
+    for column in frame.select_dtypes(include='category'):
+        stats[column] = {'count': int(frame[column].notna().sum()), **{str(name): int(days) for name, days in frame[column].value_counts(sort=False).items()}}
+    return stats
+
+def served_dataset(merge, signature, version):
+    # the merged frame with the aggregates precomputed for queries over the full date range
+    return {'merge': merge, 'signature': signature, 'version': version, 'loaded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'columns': column_stats(merge), 'stats': compute_stats(merge)}
+
+def query_range(merge, params):
+    # rows between the start and end parameters (inclusive, YYYY-MM-DD) and the columns parameter (comma separated) of a query
+    frame = merge.loc[pd.Timestamp(params['start']) if 'start' in params else None:pd.Timestamp(params['end']) if 'end' in params else None]
+    if 'columns' in params:
+        columns = params['columns'].split(',')
+        unknown = [column for column in columns if column not in frame]
+        if unknown:
+            raise ValueError(f'unknown columns: {", ".join(unknown)}')
+        frame = frame[columns]
+    return frame
+
+def query_response(dataset, path, params):
+    # answers one query of the server, returns (content type, body)
+    merge = dataset['merge']
+    full = not {'start', 'end', 'columns'} & set(params) # full date range and columns, answered from the precomputed aggregates
+    if path == '/':
+        body = {'days': len(merge), 'start': str(merge.index.min().date()), 'end': str(merge.index.max().date()), 'columns': list(merge.columns),
+                'version': dataset['version'], 'loaded': dataset['loaded'], 'panels': [panel['name'] for panel in GRAPH_PANELS],
+                'endpoints': ['/slice', '/stats', '/correlation', '/plot']}
+    elif path == '/slice':
+        frame = query_range(merge, params)
+        if params.get('format') == 'csv':
+            return 'text/csv', frame.to_csv().encode()
+        return 'application/json', frame.to_json(orient='split', date_format='iso').encode()
+    elif path == '/stats':
+        body = dataset['columns'] if full else column_stats(query_range(merge, params))
+    elif path == '/correlation':
+        method = params.get('method', 'pearson')
+        if method not in ('pearson', 'spearman', 'lagged', 'summary'):
+            raise ValueError('method must be pearson, spearman, lagged or summary')
+        lags = int(params.get('lags', STATS_LAGS))
+        stats = dataset['stats'] if full and lags == STATS_LAGS else compute_stats(query_range(merge, {key: params[key] for key in ('start', 'end') if key in params}), lags)
+        body = {'days': stats['days'], 'method': method, method: json.loads(stats[method].to_json(orient='index'))}
+    elif path == '/plot':
+        panels = {panel['name']: panel for panel in GRAPH_PANELS}
+        if params.get('panel') not in panels:
+            raise ValueError(f'panel must be one of {", ".join(panels)}')
+        fmt = params.get('format', 'png')
+        if fmt not in ('png', 'svg'):
+            raise ValueError('format must be png or svg')
+        panel, frame = panels[params['panel']], query_range(merge, {key: params[key] for key in ('start', 'end') if key in params})
+        columns = ['CRIME'] + [column for group in panel['axes'] for column, color in group]
+        buffer = io.BytesIO()
+        panel_figure(panel, {column: panel_series(frame, column, int(params.get('points', GRAPH_MAX_POINTS))) for column in columns}).savefig(buffer, format=fmt)
+        return 'image/svg+xml' if fmt == 'svg' else 'image/png', buffer.getvalue()
+    else:
+        raise LookupError(path)
+    return 'application/json', json.dumps(body).encode()
+
+def serve(merge, reload, signature, host='127.0.0.1', port=8000, cache_size=SERVE_CACHE_SIZE, interval=SERVE_RELOAD_SECONDS):
+    # serve command, answers slice, stats, correlation and plot queries over HTTP from the merged frame kept in memory
+    # reload() returns the merged frame again when signature() changed, checked every interval seconds
+    import http.server
+    import urllib.parse
+    state = {'dataset': served_dataset(merge, signature(), 1)}
+    cache = LRUCache(cache_size)
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                if signature() != state['dataset']['signature']:
+                    merge = reload()
+                    dataset = served_dataset(merge, signature(), state['dataset']['version'] + 1) # after reload(), which may itself rebuild cache entries
+                    state['dataset'] = dataset # queries in flight keep the dataset they started with
+                    cache.clear()
+                    print(f"Reloaded dataset (version {dataset['version']}, {len(dataset['merge'])} days)")
+            except Exception as error:
+                print(f'Reload failed, serving the previous dataset: {error}')
+
+    class QueryHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # keep-alive connections for dashboards polling the server
+        disable_nagle_algorithm = True # headers and body are written separately, without it each response waits for a delayed ACK
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            params = dict(urllib.parse.parse_qsl(url.query))
+            dataset = state['dataset']
+            key = (dataset['version'], url.path, tuple(sorted(params.items())))
+            response = cache.get(key)
+            if response is None:
+                try:
+                    response = (200, *query_response(dataset, url.path, params))
+                    cache.put(key, response)
+                except LookupError as error:
+                    response = (404, 'application/json', json.dumps({'error': f'not found: {error}'}).encode())
+                except ValueError as error: # e.g. unknown column or unparsable date
+                    response = (400, 'application/json', json.dumps({'error': str(error)}).encode())
+            status, content_type, body = response
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-Dataset-Version', str(dataset['version']))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # one line per request would dominate the time of cached queries
+
+    threading.Thread(target=watch, daemon=True).start()
+    server = http.server.ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    print(f'Serving {len(merge)} days on http://{host}:{server.server_port}/ (endpoints /slice, /stats, /correlation, /plot), press Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 # DEV note, do NOT change below.
    
 if __name__ == '__main__':
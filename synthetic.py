@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+#Python3
+# coding: utf-8
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+CRIME_INCIDENT_COLUMNS = ['DR_NO', 'Date Rptd', 'DATE OCC', 'TIME OCC', 'AREA', 'AREA NAME', 'Rpt Dist No', 'Part 1-2', 'Crm Cd', 'Crm Cd Desc', 'LAT', 'LON'] # subset of the LA City crime dataset layout
+CRIME_AREAS = ['Central', 'Rampart', 'Southwest', 'Hollenbeck', 'Harbor', 'Hollywood', 'Wilshire', 'West LA', 'Van Nuys', 'West Valley', 'Northeast', '77th Street', 'Newton', 'Pacific', 'N Hollywood', 'Foothill', 'Devonshire', 'Southeast', 'Mission', 'Olympic', 'Topanga']
+CRIME_CODES = [110, 210, 230, 310, 330, 341, 350, 420, 440, 510, 624, 626, 740, 745, 930] # most frequent crime codes
+WEATHER_NOAA_COLUMNS = ['STATION', 'NAME', 'LATITUDE', 'LONGITUDE', 'ELEVATION', 'DATE', 'AWND', 'PRCP', 'SNOW', 'SNWD', 'TAVG', 'TMAX', 'TMIN', 'WDF2', 'WDF5', 'WSF2', 'WSF5', 'WT01', 'WT02', 'WT03', 'WT08'] # subset of the NOAA daily summaries layout
+FLR_CLASSES = (list('ABCMX'), [0.02, 0.28, 0.55, 0.13, 0.02]) # classes and their share of DONKI flare events
+CME_TYPES = (['S', 'C', 'O', 'R', 'ER'], [0.5, 0.35, 0.1, 0.04, 0.01])
+
+
+def generate_crime_incidents(path, rows, start='2020-01-01', end='2023-12-31', chunksize=1_000_000, seed=0):
+    # writes a synthetic incident-level crime .CSV with the layout of the LA City dataset, in chunks so multi-million row files need little memory
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end).strftime('%m/%d/%Y 12:00:00 AM').to_numpy() # formatted once, rows pick by index
+    area_names = np.array(CRIME_AREAS)
+    codes = np.array(CRIME_CODES)
+    written = 0
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(CRIME_INCIDENT_COLUMNS) + '\n')
+        while written < rows:
+            n = min(chunksize, rows - written)
+            occurred = rng.integers(0, len(days), n)
+            areas = rng.integers(1, len(CRIME_AREAS) + 1, n)
+            chunk = pd.DataFrame({
+                'DR_NO': np.arange(written, written + n) + 200000000,
+                'Date Rptd': days[np.minimum(occurred + rng.integers(0, 5, n), len(days) - 1)],
+                'DATE OCC': days[occurred],
+                'TIME OCC': rng.integers(0, 24, n) * 100 + rng.integers(0, 60, n),
+                'AREA': areas,
+                'AREA NAME': area_names[areas - 1],
+                'Rpt Dist No': areas * 100 + rng.integers(0, 99, n),
+                'Part 1-2': rng.integers(1, 3, n),
+                'Crm Cd': codes[rng.integers(0, len(codes), n)],
+                'Crm Cd Desc': 'SYNTHETIC',
+                'LAT': (34.0 + rng.random(n) * 0.3).round(4),
+                'LON': (-118.5 + rng.random(n) * 0.3).round(4),
+            })
+            chunk.to_csv(f, header=False, index=False)
+            written += n
+    return path
+
+
+def generate_sources(start='2021-01-01', end='2021-12-31', seed=0):
+    # synthetic frames of every source, in the layout (and dtypes) scraper.py caches them: {'weather', 'crime', 'FLR', 'GST', 'CME'}
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end, name='DATE')
+    n = len(days)
+    season = np.cos((days.dayofyear.to_numpy() - 200) / 365 * 2 * np.pi) # warmest in July
+    weather = pd.DataFrame({
+        'AWND': rng.gamma(2.0, 0.7, n),
+        'PRCP': np.where(rng.random(n) < 0.1, rng.gamma(1.0, 0.4, n), 0.0),
+        'TMAX': 75 + 10 * season + rng.normal(0, 4, n),
+        'TMIN': 57 + 8 * season + rng.normal(0, 3, n),
+        'WDF2': rng.integers(0, 36, n) * 10.0,
+        'WDF5': rng.integers(0, 36, n) * 10.0,
+        'WSF2': rng.gamma(8.0, 1.0, n),
+        'WSF5': rng.gamma(12.0, 1.0, n),
+    }, index=days).astype('float32')
+    for column, rate in [('WT01', 0.3), ('WT02', 0.02), ('WT08', 0.45)]:
+        weather[column] = pd.array((rng.random(n) < rate).astype('int8'), dtype='Int8')
+    crime = pd.DataFrame({'CRIME': (650 + 40 * season + rng.normal(0, 30, n)).round().astype('int32')}, index=days)
+    flr_days = np.sort(rng.choice(n, n // 2, replace=False))
+    classes = rng.choice(len(FLR_CLASSES[0]), len(flr_days), p=FLR_CLASSES[1])
+    scales = rng.uniform(1, 9.9, len(flr_days)).round(1)
+    flr = pd.DataFrame({'FLR Class': pd.Categorical.from_codes(classes, categories=FLR_CLASSES[0], ordered=True),
+                        'FLR Scale': scales.astype('float32'),
+                        'FLR Flux': (10.0 ** (classes - 8) * scales).astype('float32')}, index=days[flr_days])
+    gst_days = np.sort(rng.choice(n, max(1, n // 30), replace=False))
+    gst = pd.DataFrame({'GST Index': (rng.integers(15, 27, len(gst_days)) / 3).round(2).astype('float32')}, index=days[gst_days]) # Kp in thirds, 5 to 8.67
+    cme_days = np.sort(rng.choice(n, int(n * 0.4), replace=False))
+    cme = pd.DataFrame({'CME Class': pd.Categorical(rng.choice(CME_TYPES[0], len(cme_days), p=CME_TYPES[1]), categories=CME_TYPES[0], ordered=True)}, index=days[cme_days])
+    return {'weather': weather, 'crime': crime, 'FLR': flr, 'GST': gst, 'CME': cme}
+
+
+def generate_weather_csv(path, stations=1, start='2021-01-01', end='2021-12-31', chunksize=1_000_000, seed=0):
+    # writes a synthetic NOAA daily summaries .CSV (M/D/YYYY dates, blank WT* when the weather type did not occur) for N stations, in chunks of stations
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end)
+    dates = np.array([f'{day.month}/{day.day}/{day.year}' for day in days]) # NOAA downloads do not zero pad
+    season = np.cos((days.dayofyear.to_numpy() - 200) / 365 * 2 * np.pi)
+    block = max(1, chunksize // len(days))
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(WEATHER_NOAA_COLUMNS) + '\n')
+        for first in range(0, stations, block):
+            ids = np.arange(first, min(first + block, stations))
+            n = len(ids) * len(days)
+            station = np.repeat(ids, len(days))
+            offset = np.repeat(rng.normal(0, 3, len(ids)), len(days)) # stations differ by altitude and distance to the coast
+            chunk = pd.DataFrame({
+                'STATION': np.char.add('USW', np.char.zfill(station.astype(str), 8)),
+                'NAME': np.char.add('SYNTHETIC STATION ', station.astype(str)),
+                'LATITUDE': np.repeat((33.7 + rng.random(len(ids)) * 0.6).round(4), len(days)),
+                'LONGITUDE': np.repeat((-118.7 + rng.random(len(ids)) * 0.8).round(4), len(days)),
+                'ELEVATION': np.repeat((rng.random(len(ids)) * 900).round(1), len(days)),
+                'DATE': np.tile(dates, len(ids)),
+                'AWND': rng.gamma(2.0, 0.7, n).round(2),
+                'PRCP': np.where(rng.random(n) < 0.1, rng.gamma(1.0, 0.4, n), 0.0).round(2),
+                'SNOW': np.nan,
+                'SNWD': np.nan,
+                'TAVG': np.nan,
+                'TMAX': (75 + 10 * np.tile(season, len(ids)) + offset + rng.normal(0, 4, n)).round().astype(int),
+                'TMIN': (57 + 8 * np.tile(season, len(ids)) + offset + rng.normal(0, 3, n)).round().astype(int),
+                'WDF2': rng.integers(0, 36, n) * 10,
+                'WDF5': rng.integers(0, 36, n) * 10,
+                'WSF2': rng.gamma(8.0, 1.0, n).round(1),
+                'WSF5': rng.gamma(12.0, 1.0, n).round(1),
+            })
+            for column, rate in [('WT01', 0.3), ('WT02', 0.02), ('WT03', 0.01), ('WT08', 0.45)]:
+                chunk[column] = np.where(rng.random(n) < rate, '1', '')
+            chunk.to_csv(f, header=False, index=False)
+    return path
+
+
+def generate_crime_pages(start='2021-01-01', end='2021-12-31', page_size=100, seed=0):
+    # pages of aggregated daily crime counts, as returned by the SODA query endpoint of the crime dataset
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end)
+    counts = (650 + 40 * np.cos((days.dayofyear.to_numpy() - 200) / 365 * 2 * np.pi) + rng.normal(0, 30, len(days))).round().astype(int)
+    records = [{'date_occ': day.strftime('%Y-%m-%dT00:00:00.000'), 'count_date_occ': str(count)} for day, count in zip(days, counts)] # SODA returns every value as a string
+    return [records[offset:offset + page_size] for offset in range(0, len(records), page_size)]
+
+
+def generate_donki_events(start='2021-01-01', end='2021-12-31', seed=0):
+    # DONKI event records {'FLR': [...], 'GST': [...], 'CME': [...]}, in the layout of the FLR, GST and CME endpoints
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end)
+
+    def times(rate):
+        picked = np.sort(rng.choice(len(days), int(len(days) * rate)))
+        return [(days[day] + pd.Timedelta(minutes=int(minute))).strftime('%Y-%m-%dT%H:%MZ') for day, minute in zip(picked, rng.integers(0, 1440, len(picked)))]
+
+    flr = [{'flrID': f'{time[:-1]}:00-FLR-{number:03}', 'instruments': [{'displayName': 'GOES-P: EXIS 1.0-8.0'}], 'beginTime': time, 'peakTime': time, 'endTime': time,
+            'classType': f'{rng.choice(FLR_CLASSES[0], p=FLR_CLASSES[1])}{rng.uniform(1, 9.9):.1f}', 'sourceLocation': 'N19W62', 'activeRegionNum': int(rng.integers(12700, 13200)), 'linkedEvents': None}
+           for number, time in enumerate(times(0.8))]
+    gst = [{'gstID': f'{time[:-1]}:00-GST-{number:03}', 'startTime': time,
+            'allKpIndex': [{'observedTime': time, 'kpIndex': round(kp / 3, 2), 'source': 'NOAA'} for kp in np.sort(rng.integers(15, 27, rng.integers(1, 4)))[::-1]], 'linkedEvents': None}
+           for number, time in enumerate(times(0.03))]
+    cme = [{'activityID': f'{time[:-1]}:00-CME-{number:03}', 'catalog': 'M2M_CATALOG', 'startTime': time, 'sourceLocation': '', 'activeRegionNum': None,
+            'cmeAnalyses': None if rng.random() < 0.15 else [{'time21_5': time, 'speed': float(rng.integers(200, 1500)), 'type': str(rng.choice(CME_TYPES[0], p=CME_TYPES[1])), 'isMostAccurate': True}]} # some events are never analysed
+           for number, time in enumerate(times(0.6))]
+    return {'FLR': flr, 'GST': gst, 'CME': cme}
+
+
+def write_fixtures(directory, start='2021-01-01', end='2021-12-31', seed=0):
+    # writes crime_pages.json and donki_events.json, offline stand-ins for the responses of the crime and DONKI endpoints
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, 'crime_pages.json'), os.path.join(directory, 'donki_events.json')]
+    for path, payload in zip(paths, [generate_crime_pages(start, end, seed=seed), generate_donki_events(start, end, seed=seed)]):
+        with open(path, 'w') as f:
+            json.dump(payload, f)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates synthetic datasets, in the layout of the real sources, to exercise scraper.py at scale')
+    commands = parser.add_subparsers(dest='command', required=True)
+    crime = commands.add_parser('crime', help='incident-level crime .CSV (input of scraper.py --crime-incidents)')
+    crime.add_argument('path', type=str)
+    crime.add_argument('--rows', type=int, default=5_000_000)
+    crime.add_argument('--start', type=str, default='2020-01-01')
+    crime.add_argument('--end', type=str, default='2023-12-31')
+    crime.add_argument('--seed', type=int, default=0)
+    weather = commands.add_parser('weather', help='NOAA daily summaries .CSV of N stations (input of scraper.py --weather)')
+    weather.add_argument('path', type=str)
+    weather.add_argument('--stations', type=int, default=1)
+    weather.add_argument('--start', type=str, default='2021-01-01')
+    weather.add_argument('--end', type=str, default='2021-12-31')
+    weather.add_argument('--seed', type=int, default=0)
+    fixtures = commands.add_parser('fixtures', help='crime pages and DONKI events as served by their endpoints (offline input of benchmark.py)')
+    fixtures.add_argument('directory', type=str, nargs='?', default='fixtures')
+    fixtures.add_argument('--start', type=str, default='2021-01-01')
+    fixtures.add_argument('--end', type=str, default='2021-12-31')
+    fixtures.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    if args.command == 'crime':
+        generate_crime_incidents(args.path, args.rows, args.start, args.end, seed=args.seed)
+        print(f'Wrote {args.rows:,} crime incidents to {args.path} in {time.perf_counter() - started:.1f}s')
+    elif args.command == 'weather':
+        generate_weather_csv(args.path, args.stations, args.start, args.end, seed=args.seed)
+        print(f'Wrote weather of {args.stations:,} stations to {args.path} in {time.perf_counter() - started:.1f}s')
+    elif args.command == 'fixtures':
+        print('Wrote', ', '.join(write_fixtures(args.directory, args.start, args.end, args.seed)))
+
+if __name__ == '__main__':
+    main()